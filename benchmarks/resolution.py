@@ -0,0 +1,192 @@
+#! /usr/bin/env python3
+"""Time how long cde takes to find directories
+
+Synthetic histories and directory trees are made under a temporary $HOME
+    so real history is neither read, nor changed
+
+Timings are written as JSON, one result per function per history size
+    with p50, p95 and p99 in milliseconds
+    so that runs from different commits can be compared
+"""
+
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from pysyte.cli.main import run
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+words = ["src", "lib", "bin", "docs", "tests", "build", "tools", "app"]
+
+
+def add_args(parser):
+    """Handle arguments from the command line"""
+    parser.string("s", "sizes", default="1000,10000,100000", help="history sizes")
+    parser.integer("f", "fanout", default=4, help="sub-directories per directory")
+    parser.integer("d", "depth", default=4, help="levels of directories")
+    parser.integer("r", "repeats", default=50, help="timings per function")
+    parser.string("o", "output", default="", help="write JSON to this file")
+    parser.boolean("q", "sqlite", help="keep history in SQLite, not CSV")
+    return parser
+
+
+def make_tree(root: str, fanout: int, depth: int) -> list:
+    """Make directories under root, fanout at each level, depth levels down"""
+    made, parents = [], [root]
+    for level in range(depth):
+        children = []
+        for parent in parents:
+            for i in range(fanout):
+                child = os.path.join(parent, f"{words[i % len(words)]}{level}{i}")
+                os.mkdir(child)
+                children.append(child)
+        made.extend(children)
+        parents = children
+    return made
+
+
+def make_history(root: str, size: int) -> list:
+    """Make size directories under root, and history items for them"""
+    rng = random.Random(size)
+    now = time.time()
+    items = []
+    for i in range(size):
+        word, other = words[i % len(words)], words[(i // 800) % len(words)]
+        path_ = os.path.join(root, f"{word}{i // 8 % 100}", f"{other}{i}")
+        os.makedirs(path_)
+        rank = int(rng.paretovariate(1.2))
+        items.append([str(rank), path_, str(now - rng.uniform(0, 365 * 86400))])
+    return items
+
+
+def percentiles(timings: list) -> dict:
+    """p50, p95 and p99 of timings (in seconds), as milliseconds
+
+    >>> percentiles([0.001] * 10)['p50']
+    1.0
+    """
+    quantiles = statistics.quantiles(timings, n=100, method="inclusive")
+    as_ms = lambda x: round(x * 1000, 4)
+    return {
+        "p50": as_ms(quantiles[49]),
+        "p95": as_ms(quantiles[94]),
+        "p99": as_ms(quantiles[98]),
+    }
+
+
+def timed(method, repeats: int, before=None) -> dict:
+    """Call method repeatedly, giving percentiles of how long it took"""
+    timings = []
+    for _ in range(repeats):
+        if before:
+            before()
+        start = time.perf_counter()
+        try:
+            method()
+        except (ValueError, NotImplementedError):
+            # TryAgain, ToDo: cde found too many, or none
+            pass
+        timings.append(time.perf_counter() - start)
+    return percentiles(timings)
+
+
+def commit() -> str:
+    """The commit being benchmarked, if known"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def benchmark(args, home: str) -> list:
+    from cde import cde
+    from cde import history
+
+    tree_root = os.path.join(home, "tree")
+    os.mkdir(tree_root)
+    make_tree(tree_root, args.fanout, args.depth)
+    tree_path = cde.paths.path(tree_root)
+    results = []
+    for size in (int(_) for _ in args.sizes.split(",")):
+        history_root = os.path.join(home, f"history{size}")
+        items = make_history(history_root, size)
+        cde.write_paths(items)
+        if args.sqlite:
+            history.migrate(cde._path_to_history(), cde._path_to_sqlite())
+        frecent_paths = cde.frecent_history_paths()
+        # Look for a directory from the middle of history, and for its parent
+        path_to_parent, name = os.path.split(items[size // 2][1])
+        parent = os.path.basename(path_to_parent)
+        forget = lambda: history._histories.clear()
+        methods = {
+            "read_history": (cde.read_history, forget),
+            "write_paths": (lambda: cde.write_paths(items), None),
+            "frecently_matched": (
+                lambda: cde.frecently_matched(name, frecent_paths),
+                None,
+            ),
+            "find_in_history": (
+                lambda: cde.find_in_history(parent, [name[:-1]]),
+                None,
+            ),
+            "possibles_under_directory": (
+                lambda: cde.possibles_under_directory(tree_path, ["src", "lib"]),
+                None,
+            ),
+            "find_directory": (lambda: cde.find_directory(name, []), None),
+            "completions": (lambda: cde.completions(name[:2]), None),
+        }
+        for function, (method, before) in methods.items():
+            result = {"function": function, "history": size, "runs": args.repeats}
+            result.update(timed(method, args.repeats, before))
+            results.append(result)
+        if args.sqlite:
+            os.remove(cde._path_to_sqlite())
+        history._histories.clear()
+    return results
+
+
+def main(args):
+    """Benchmark cde under a temporary $HOME"""
+    home = tempfile.mkdtemp(prefix="cde-benchmark-")
+    real_home = os.environ.get("HOME", "")
+    os.environ["HOME"] = home
+    cwd = os.getcwd()
+    os.chdir(home)
+    try:
+        results = benchmark(args, home)
+    finally:
+        os.chdir(cwd)
+        os.environ["HOME"] = real_home
+        shutil.rmtree(home)
+    report = {
+        "commit": commit(),
+        "python": sys.version.split()[0],
+        "fanout": args.fanout,
+        "depth": args.depth,
+        "store": "sqlite" if args.sqlite else "csv",
+        "results": results,
+    }
+    string = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as stream:
+            stream.write(f"{string}\n")
+    else:
+        print(string)
+    return os.EX_OK
+
+
+run(main, add_args)
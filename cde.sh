@@ -215,7 +215,6 @@ cdpy () {
         return 0
     fi
     [[ $cde_output_ ]] || return $?
-    python_cde --add $cde_output_
     same_path . "$cde_output_" && return 0
     local cde_directory_="$cde_output_" readlink_directory_=$(readlink -f $cde_output_)
     same_path . "$readlink_directory_" && return 0
@@ -403,6 +402,11 @@ pudb_cde () {
 
 # xxxxxxxxx
 
+cde_serve () {
+    local __doc__="""Start a cde server in the background, python_cde will use it"""
+    ( run_cde python3 --serve . >/dev/null 2>&1 & )
+}
+
 echo_dir () {
     if [[ -d "$1" ]]; then
         echo $1
@@ -573,8 +577,46 @@ run_cde () {
     fi
 }
 
+cde_socket () {
+    local __doc__="""Where a cde server would listen"""
+    echo "$HOME/.config/cde/socket"
+}
+
+served_cde () {
+    local __doc__="""Ask a running cde server to handle args, status 126 if it cannot connect"""
+    local socket_=$(cde_socket)
+    [[ -S "$socket_" ]] || return 126
+    is_type socat || return 126
+    local command_=resolve
+    case "$1" in
+        -a|--add) command_=add; shift ;;
+        -c|--complete) command_=complete; shift ;;
+        -d|--delete) command_=delete; shift ;;
+        -*) return 126 ;;
+    esac
+    local variables_=("PATH=$PATH") name_
+    for name_ in $(compgen -e CDE_); do
+        variables_+=("$name_=${!name_}")
+    done
+    local response_
+    response_=$(printf '%s\0' "$PWD" "${variables_[@]}" "$command_" "$@" | socat -t 5 - "UNIX-CONNECT:$socket_" 2>/dev/null) || return 126
+    # Once connected, the request may have been handled, so is not run again
+    local line_= status_=1
+    while IFS= read -r line_; do
+        case "${line_:0:2}" in
+            "1 ") echo "${line_:2}" ;;
+            "2 ") echo "${line_:2}" >&2 ;;
+            "? ") status_="${line_:2}" ;;
+        esac
+    done <<< "$response_"
+    return $status_
+}
+
 python_cde () {
-    local __doc__="""Run the cde program"""
+    local __doc__="""Run the cde program, on a cde server if there is one"""
+    served_cde "$@"
+    local served_=$?
+    [[ $served_ == 126 ]] || return $served_
     run_cde python3 "$@"
 }
 
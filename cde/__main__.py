@@ -1,12 +1,35 @@
 #! /usr/bin/env python3
 """cde knows where you are going because it knows where you've been"""
-import bdb
 
-from pysyte.types import paths
-from pysyte.cli import arguments
-from pysyte.cli.main import run
+from __future__ import annotations
+
+import os
+import sys
+from types import SimpleNamespace
+from typing import TYPE_CHECKING
+from typing import List
+from typing import Optional
 
 from cde import cde
+from cde import lazy
+
+if TYPE_CHECKING:
+    from pysyte.cli import arguments
+    from pysyte.types import paths
+else:
+    paths = lazy.module("pysyte.types.paths")
+
+bdb = lazy.module("bdb")
+
+# Options which can be run without pysyte's parser
+quick_options = {
+    "-b": "batch",
+    "--batch": "batch",
+    "-c": "complete",
+    "--complete": "complete",
+    "-v": "version",
+    "--version": "version",
+}
 
 
 def add_args(parser: arguments.ArgumentsParser):
@@ -14,6 +37,7 @@ def add_args(parser: arguments.ArgumentsParser):
 
     Insist on at least one empty string
 
+    >>> from pysyte.cli import arguments
     >>> parser = arguments.parser()
     >>> add_args(parser)
     >>> args = assert parser.parse_string("-v -m")
@@ -27,20 +51,27 @@ def add_args(parser: arguments.ArgumentsParser):
 
     # From here argument names correspend to methods in the cde module
     parser.opt("a", "add", help="add a path to history")
-    parser.opt("c", "complete", help="show all paths in history")
+    parser.opt("b", "batch", help="find paths for queries on stdin, as JSON")
+    parser.opt("c", "complete", help="show paths in history completing a dirname")
     parser.opt("d", "delete", help="delete a path from history")
     parser.opt("e", "existing", help="show all real paths in history")
     parser.opt("f", "filename", help="show filename of the script")
     parser.opt("l", "lost", help="show all unreal paths in history")
     parser.opt("m", "makedir", help="Ensure the given directory exists")
+    parser.opt("M", "migrate", help="move history from CSV to SQLite")
     parser.opt("o", "old", help="look for paths in history")
     parser.opt("p", "purge", help="remove all non-existent paths from history")
+    parser.opt("P", "profile", help="trace stages of this lookup to stderr")
     parser.opt("q", "quietly", help="do not write to stderr")
     #   parser.opt(" ", "Quietly", help="do not write to stdout")
     parser.opt("Q", "QUIETLY", help="do not write to stdout, nor stderr")
+    parser.opt("r", "refresh", help="index directories under index_roots")
+    parser.opt("s", "serve", help="answer requests on a socket")
+    parser.opt("S", "stats", help="show the slowest stages in the trace log")
     parser.opt("t", "test", help="test the script")
     parser.opt("u", "unused", help="show unused args")
     parser.opt("v", "version", help="show version of the script")
+    parser.opt("w", "watch", help="keep the index and history current")
     return parser
 
 
@@ -87,8 +118,46 @@ def post_parse(args):
     return args
 
 
-def main(args):
-    """Show a directory from the command line arguments (or some derivative)"""
+def quick_args(argv: List[str]) -> Optional[SimpleNamespace]:
+    """Arguments for the commonest command lines, parsed without pysyte
+
+    Those are dirnames alone, or with one of the quick_options
+        or one of the quick_options alone, as if with the default dirname
+    Anything else gives None, and needs the full parser
+
+    >>> args = quick_args(['/usr', 'lo', '2', '1'])
+    >>> args.dirnames, args.index
+    (['/usr', 'lo', '2', '1'], 1)
+    >>> quick_args(['-v', '.']).options
+    ['version']
+    >>> assert quick_args(['-a', '.']) is None
+    >>> quick_args(['--batch']).dirnames
+    ['.']
+    """
+    options = [_ for _ in argv if _.startswith("-") and _ != "-"]
+    dirnames_ = [_ for _ in argv if _ not in options]
+    if not (dirnames_ or options) or len(options) > 1:
+        return None
+    if options and options[0] not in quick_options:
+        return None
+    numbers = [int(_) for _ in dirnames_ if _.isdigit()]
+    return SimpleNamespace(
+        dirnames=dirnames_ or ["."],
+        index=min(numbers) if numbers else None,
+        options=[quick_options[_] for _ in options],
+        unused=False,
+    )
+
+
+def quickly(args: SimpleNamespace):
+    """Run quick_args as the full parser's args would be"""
+    for option in args.options:
+        getattr(cde, option)(args)
+    return main(args)
+
+
+def show_directory(args):
+    """Show (and remember) a directory from the command line arguments"""
     try:
         if args.unused:
             pass
@@ -105,18 +174,36 @@ def main(args):
     except cde.TryAgain as e:
         if any([p.isfile() for p in e.possibles]):
             raise
-        if args.index is not None:
+        index = getattr(args, "index", None)
+        if index is not None:
             try:
-                one = e.possibles[args.index]
-                cde.stdout(one)
-                return True
+                one = e.possibles[index]
+                return cde.show_found_item(one)
             except IndexError:
                 pass
-        cde.stderr("Try again:", e)
+        cde.stderr(f"Try again: {e}")
         return False
     except cde.ToDo as e:
-        cde.stderr("Error:", e)
+        cde.stderr(f"Error: {e}")
         return False
 
 
-run(main, add_args, post_parse, usage="%(prog)s [dirname [subdirname ...]")
+def main(args):
+    """Show a directory from the command line arguments (or some derivative)
+
+    That one process finds the directory and remembers it,
+        so the shell needs only to cd there if the status is 0
+    """
+    result = show_directory(args)
+    if isinstance(result, bool):
+        return os.EX_OK if result else 1
+    return result
+
+
+if __name__ == "__main__":
+    args = quick_args(sys.argv[1:])
+    if args:
+        sys.exit(quickly(args))
+    from pysyte.cli.main import run
+
+    run(main, add_args, post_parse, usage="%(prog)s [dirname [subdirname ...]")
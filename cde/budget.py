@@ -0,0 +1,122 @@
+"""Limits on how far a lookup searches under a directory
+
+Searching under here, or at home, can descend through many directories
+    e.g. for a mistyped name in / or a huge repo
+So those searches have a budget (see cde.config), of
+    seconds since the search started
+    levels below the directory it started from
+    and directories it may list
+Any limit of 0 is no limit
+
+Once the budget is spent, no more directories are listed
+    and the search gives the best of what it has found so far
+    which may not be what a search within budget would find
+So a lookup can be told whether any of its budgets were spent (see spending())
+"""
+
+import contextlib
+import os
+import threading
+import time
+from typing import Iterator
+from typing import Optional
+
+from cde import config
+from cde import trace
+
+
+class Spending:
+    """Whether any budget of one lookup was spent"""
+
+    def __init__(self):
+        self.spent = False
+
+
+_spending: Optional[Spending] = None
+
+
+@contextlib.contextmanager
+def spending() -> Iterator[Spending]:
+    """Note whether any budget made in this block is spent
+
+    >>> with spending() as lookup:
+    ...     budget = Budget('/', directories=1)
+    ...     assert budget.allows('/') and not budget.allows('/')
+    >>> assert lookup.spent
+    """
+    global _spending
+    previous = _spending
+    _spending = Spending()
+    try:
+        yield _spending
+    finally:
+        _spending = previous
+
+
+class Budget:
+    """What a search under root may spend"""
+
+    def __init__(
+        self,
+        root,
+        seconds: float = 0,
+        depth: int = 0,
+        directories: int = 0,
+    ):
+        self.root = os.path.abspath(str(root))
+        self.seconds = seconds
+        self.depth = depth
+        self.directories = directories
+        self.started = time.perf_counter()
+        self.listed = 0
+        self.spent = False
+        self.spending = _spending
+        self._lock = threading.Lock()
+
+    def level(self, path_to_dir) -> int:
+        """How many levels that directory is below root
+
+        >>> Budget('/usr').level('/usr/local/lib')
+        2
+        """
+        relative = os.path.relpath(os.path.abspath(str(path_to_dir)), self.root)
+        return 0 if relative == os.curdir else len(relative.split(os.path.sep))
+
+    def allows(self, path_to_dir) -> bool:
+        """Whether that directory may be listed, counting it if so
+
+        >>> budget = Budget('/usr', depth=1, directories=2)
+        >>> assert not budget.allows('/usr/local/lib')
+        >>> assert budget.allows('/usr') and budget.allows('/usr/local')
+        >>> assert not budget.allows('/usr/lib') and budget.spent
+        """
+        if self.depth and self.level(path_to_dir) > self.depth:
+            return False
+        with self._lock:
+            if self.spent or self._overspent():
+                self._spend()
+                return False
+            self.listed += 1
+        return True
+
+    def _overspent(self) -> bool:
+        if self.directories and self.listed >= self.directories:
+            return True
+        return bool(self.seconds) and time.perf_counter() - self.started > self.seconds
+
+    def _spend(self) -> None:
+        if not self.spent:
+            self.spent = True
+            if self.spending:
+                self.spending.spent = True
+            trace.count("budget_spent")
+
+
+def configured(root) -> Budget:
+    """The budget for a search under root, from settings"""
+    return Budget(
+        root,
+        seconds=config.number("search_seconds"),
+        depth=int(config.number("search_depth")),
+        directories=int(config.number("search_directories")),
+    )
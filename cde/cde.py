@@ -1,26 +1,49 @@
 """cde.py knows where you are going because it knows where you've been"""
 
+from __future__ import annotations
 
+import json
 import os
 import sys
+import threading
 from fnmatch import fnmatch
-import csv
+from typing import TYPE_CHECKING
 from typing import Callable
+from typing import Dict
+from typing import Iterator
 from typing import List
 from typing import Optional
 
 
-from boltons.iterutils import unique
-from pysyte.types import paths
 from pysyte.types.numbers import as_int
 from pysyte.iteration import first_that
 
+from cde import lazy
+from cde import budget
+from cde import completion
+from cde import commands
+from cde import history
+from cde import listings
+from cde import prune
+from cde import race
+from cde import resolved
+from cde import config
 from cde import timings
+from cde import trace
+from cde import tree
+from cde.index import IndexedPaths
 from cde.types import PossiblePaths
 from cde.types import UniquePaths
 from cde.types import Roots
 from cde import __version__
 
+if TYPE_CHECKING:
+    from boltons import iterutils
+    from pysyte.types import paths
+else:
+    iterutils = lazy.module("boltons.iterutils")
+    paths = lazy.module("pysyte.types.paths")
+
 
 class ToDo(NotImplementedError):
     """Errors raised by this script"""
@@ -71,9 +94,16 @@ def matching_sub_directories(path_to_dir: str, pattern: str) -> List[paths.Strin
     If the pattern ends with "/" then look for an exact match only
     Otherwise look for "pattern*"
         If that gives one exact match, prefer that
+    Pruned directories (see cde.prune) are not matched, unless named exactly
     """
     pattern_glob = pattern.endswith("/") and pattern.rstrip("/") or f"*{pattern}*"
-    sub_directories = paths.list_sub_directories(path_to_dir, pattern_glob)
+    is_pruned = prune.matcher()
+    name = pattern.rstrip("/")
+    sub_directories = [
+        _
+        for _ in list_sub_directories(path_to_dir, pattern_glob)
+        if not is_pruned(os.path.basename(_)) or os.path.basename(_) == name
+    ]
 
     if len(sub_directories) < 2:
         return sub_directories
@@ -83,6 +113,20 @@ def matching_sub_directories(path_to_dir: str, pattern: str) -> List[paths.Strin
     return sub_directories
 
 
+def list_sub_directories(path_to_dir: str, glob: str) -> List[paths.StringPath]:
+    """All sub-directories of the given directory matching the given glob
+
+    Names come from the index of directories, if it knows that directory
+        otherwise the directory is listed
+    """
+    tree_ = _directory_tree()
+    names = tree_.sub_directories(path_to_dir) if tree_ else None
+    if names is None:
+        names = listings.current().names(path_to_dir, glob, "dir")
+    path_ = str(path_to_dir)
+    return [paths.DirectPath(os.path.join(path_, _)) for _ in names if fnmatch(_, glob)]
+
+
 def as_menu_items(strings):
     return [""] + [f"{i:2} {p}" for i, p in enumerate(strings)]
 
@@ -126,31 +170,39 @@ def first_integer(items):
 
 
 def possibles_under_directory(
-    cde_path: paths.StringPath, sub_dirs: List[str]
+    cde_path: paths.StringPath,
+    sub_dirs: List[str],
+    budget_: Optional[budget.Budget] = None,
 ) -> PossiblePaths:
     """Look under the given directory for matching sub-directories
 
     Sub-directories match if they are prefixed with given sub_dirs
     If no sub-directories match, but a file matches
         then use the directory
+
+    With a budget, nothing more is listed once it is spent
     """
     if not sub_dirs:
         return PossiblePaths([cde_path])
     possibles = PossiblePaths()
+    if budget_ and not budget_.allows(cde_path):
+        return possibles
     prefix, sub_dirs = sub_dirs[0], sub_dirs[1:]
     paths_to_match = matching_sub_directories(cde_path, prefix)
     if not paths_to_match:
         found = []
-        if paths.contains_file(cde_path, f"{prefix}*"):
+        if listings.current().contains(cde_path, f"{prefix}*", "file"):
             found = [cde_path]
         else:
             path_to_prefix = cde_path / prefix
-            if path_to_prefix.isdir():
+            if listings.current().isdir(path_to_prefix):
                 found = [path_to_prefix]
         possibles.extend(found)
         return possibles
-    for path_to_match in paths_to_match:
-        possibles.extend(possibles_under_directory(path_to_match, sub_dirs))
+    for found in fanned_out(
+        lambda p: possibles_under_directory(p, sub_dirs, budget_), paths_to_match
+    ):
+        possibles.extend(found)
     if possibles:
         return possibles
     try:
@@ -163,15 +215,48 @@ def possibles_under_directory(
     return possibles
 
 
-def find_under_directory(cde_path: str, sub_dirs: List[str]):
+_fanning = threading.local()
+
+
+def fanned_out(method: Callable, items: list) -> list:
+    """The results of method for each of the items, in the same order
+
+    Items are run on a pool of threads (as many as the workers setting)
+        except from within that pool, where they are run one after another
+
+    >>> fanned_out(lambda x: x * 2, [3, 1, 2])
+    [6, 2, 4]
+    """
+    workers = int(config.number("workers"))
+    if workers < 2 or len(items) < 2 or getattr(_fanning, "out", False):
+        return [method(_) for _ in items]
+
+    event = listings.cancelling()
+
+    def fan(item):
+        _fanning.out = True
+        with listings.cancellable(event):
+            return method(item)
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(items))) as pool:
+        return list(pool.map(fan, items))
+
+
+@trace.staged
+def find_under_directory(
+    cde_path: str, sub_dirs: List[str], budget_: Optional[budget.Budget] = None
+):
     """Find one directory under cde_path, matching sub_dirs
 
     Try any prefixed sub-directories
         then any prefixed files
+    Within the budget, if one is given (see cde.budget)
 
     Can give None (no matches), or the match, or an Exception
     """
-    possibles = possibles_under_directory(cde_path, sub_dirs)
+    possibles = possibles_under_directory(cde_path, sub_dirs, budget_)
     return first_possible(possibles)
 
 
@@ -192,7 +277,7 @@ def find_python_root_dir(possibles):
     if len(names) == 1:
         for possible in possibles:
             setup = possible / "setup.py"
-            if setup.isfile():
+            if listings.current().isfile(setup):
                 return possible
     eggless = {paths.path(p.replace(".egg-info", "")) for p in possibles}
     if len(eggless) == 1:
@@ -201,8 +286,6 @@ def find_python_root_dir(possibles):
 
 
 def first_possible(possibles):
-    if len(possibles) < 2:
-        purge()
     if not possibles:
         return None
     if len(possibles) == 1:
@@ -214,35 +297,48 @@ def first_possible(possibles):
     raise TryAgain(possibles)
 
 
+@trace.staged
 def find_under_here(*args):
-    """Look for some other directories under current directory"""
+    """Look for some other directories under current directory
+
+    Within the configured budget (see cde.budget)
+    """
     try:
-        return find_under_directory(paths.pwd(), *args)
+        here = paths.pwd()
+        return find_under_directory(here, *args, budget.configured(here))
     except OSError:
         return []
 
 
+@trace.staged
 def find_in_environment_path(filename_):
     """Return the first directory in $PATH with a file called filename_
 
     This is equivalent to "which" command for executable files
+    Directories are looked up in an index (see cde.commands)
     """
     if not filename_:
         return None
+    if os.path.sep not in filename_:
+        commands_ = commands.Commands(_path_to_commands(), os.environ.get("PATH", ""))
+        path_to_dir = commands_.directory(filename_)
+        return paths.path(path_to_dir) if path_to_dir else None
     for cde_path in paths.environ_paths("PATH"):
         if not cde_path:
             continue
         path_to_file = cde_path / filename_
-        if path_to_file.isfile():
+        if listings.current().isfile(path_to_file):
             return cde_path
     return None
 
 
+@trace.staged
 def find_at_home(dir_: str, sub_dirs: List[str]):
     """Return the first directory under the home directory matching the dir_
 
     Match on sub-directories first, then files
         Might return home directory itself
+    Within the configured budget (see cde.budget)
 
     >>> import random
     >>> a_home_dir = random.choice(paths.home().dirs())
@@ -253,7 +349,8 @@ def find_at_home(dir_: str, sub_dirs: List[str]):
         subdirs = sub_dirs
     else:
         subdirs = [dir_] + sub_dirs
-    return find_under_directory(paths.home(), subdirs)
+    home = paths.home()
+    return find_under_directory(home, subdirs, budget.configured(home))
 
 
 def hidden(path_name):
@@ -261,16 +358,18 @@ def hidden(path_name):
 
 
 def build_dir(directory):
-    return ".egg" in directory or directory in (
-        "htmlcov",
-        "build",
-    )
+    """Whether that directory is pruned, as build directories are (see cde.prune)
+
+    >>> assert build_dir('cde.egg-info') and build_dir('/path/to/htmlcov')
+    """
+    return prune.pruned(os.path.basename(directory))
 
 
 def ignorable_dir(directory):
     return hidden(directory) or build_dir(directory)
 
 
+@trace.staged
 def find_path_to_dir(dir_: str) -> paths.StringPath:
     """Find the path to the given dir_
 
@@ -280,8 +379,8 @@ def find_path_to_dir(dir_: str) -> paths.StringPath:
     def select_sub_dir(
         parent: paths.StringPath, patterned_sub_dirs: List[paths.StringPath]
     ) -> paths.StringPath:
-        python_dir = (
-            lambda x: not ignorable_dir(x)
+        python_dir = lambda x: (
+            not ignorable_dir(x)
             if find_python_root_dir(patterned_sub_dirs)
             else lambda x: True
         )
@@ -303,15 +402,16 @@ def find_path_to_dir(dir_: str) -> paths.StringPath:
             if not dir_:
                 return paths.root()
         path_ = paths.path(dir_)
-        if path_.isdir():
+        listings_ = listings.current()
+        if listings_.isdir(path_):
             return path_
         if user_says_its_a_directory:
             return path_
         parent = path_.parent
-        if path_.isfile():
+        if listings_.isfile(path_):
             return parent
         if path_.islink():
-            if parent.isdir():
+            if listings_.isdir(parent):
                 # FIXME - follow the link
                 return parent
         if not parent:
@@ -320,12 +420,13 @@ def find_path_to_dir(dir_: str) -> paths.StringPath:
         # Tried the full path, let's try just the name
         name = path_.basename()
         pattern = f"{name}*"
-        if paths.contains_directory(parent, pattern):
-            patterned_sub_dirs = parent.dirs(pattern)
+        names = listings_.names(parent, pattern, "dir")
+        if names:
+            patterned_sub_dirs = [parent / _ for _ in names]
             return select_sub_dir(parent, patterned_sub_dirs)
-        elif paths.contains_glob(parent, pattern):
+        elif listings_.contains(parent, pattern):
             return parent
-        if parent.isdir():
+        if listings_.isdir(parent):
             raise FoundParent(parent)
         return paths.path(None)
 
@@ -349,31 +450,33 @@ def find_directory(dir_: str, sub_dirs: List[str]):
         or an dir_ in history (if any)
         or a directory under $HOME
     Otherwise look for sub_dirs as a partial match
+
+    Those are tried in that order, or, with the race setting, all at once
+        (see cde.race)
     """
     cde_path = find_path_to_dir(dir_)
     if cde_path:
         if not sub_dirs:
             return cde_path
-        path_to_prefix = find_under_directory(cde_path, sub_dirs)
-        if path_to_prefix:
-            return path_to_prefix
-        path_to_history = find_in_history(dir_, sub_dirs)
-        if path_to_history:
-            return path_to_history
+        # Each strategy has its own sub_dirs, in case it changes them
+        strategies = [
+            lambda: find_under_directory(cde_path, list(sub_dirs)),
+            lambda: find_in_history(dir_, list(sub_dirs)),
+            lambda: cde_path,
+        ]
     else:
         args = ([dir_] if dir_ else []) + sub_dirs
-        cde_path = find_under_here(args)
-    if cde_path:
-        return cde_path
-    cde_path = find_in_history(dir_, sub_dirs)
-    if cde_path:
-        return cde_path
-    cde_path = find_in_environment_path(dir_)
-    if cde_path:
-        return cde_path
-    cde_path = find_at_home(dir_, sub_dirs)
-    if cde_path:
-        return cde_path
+        strategies = [
+            lambda: find_under_here(list(args)),
+            lambda: find_in_history(dir_, list(sub_dirs)),
+            lambda: find_in_environment_path(dir_),
+            lambda: find_at_home(dir_, list(sub_dirs)),
+        ]
+    found = (
+        race.raced(strategies) if config.number("race") else race.in_turn(strategies)
+    )
+    if found:
+        return found
     raise ToDo("could not use %r as a directory" % " ".join([dir_] + sub_dirs))
 
 
@@ -429,6 +532,14 @@ def test(_args):
     stdout("All tests passed")
 
 
+def serve(_args=None):
+    """Answer cde requests on a socket, until interrupted"""
+    from cde import server
+
+    server.serve(_path_to_socket())
+    raise SystemExit(os.EX_OK)
+
+
 def makedir(args):
     """Make the directory in the args unless it exists"""
     path_to_dirname = paths.path(args.dirname)
@@ -445,10 +556,60 @@ def old(args):
     raise SystemExit(os.EX_OK)
 
 
-def complete(_args=None):
-    """Show all paths in history"""
-    history_items = read_history()
-    for _rank, path, _time in history_items:
+def batch(_args=None):
+    """Find directories for queries from stdin, writing a JSON line for each
+
+    Queries are one per line, each a dir_ and sub_dirs separated by whitespace
+    Or, if there are any NULs, queries are separated by NULs
+        and a dir_ and sub_dirs by tabs, so they can have spaces
+    Each JSON line has the query, and the path found
+        or the error, its message, and any possible paths to try again with
+    There is a JSON line for every query, in order, even for empty ones
+    """
+    text = sys.stdin.read()
+    if "\0" in text:
+        ended = text[:-1] if text.endswith("\0") else text
+        queries = [[_ for _ in q.split("\t") if _] for q in ended.split("\0")]
+    else:
+        queries = [_.split() for _ in text.splitlines()]
+    asked = [_ for _ in queries if _]
+    answers = iter(find_all(asked))
+    for query in queries:
+        found = next(answers) if query else ToDo("no directory given")
+        stdout(json.dumps(as_json(query, found)))
+    raise SystemExit(os.EX_OK)
+
+
+def as_json(query: List[str], found) -> dict:
+    """What was found for that query, as JSON
+
+    >>> as_json(['us', 'lo'], '/usr/local')
+    {'query': 'us lo', 'path': '/usr/local'}
+    >>> as_json(['not'], ToDo('could not'))['error']
+    'ToDo'
+    """
+    result: Dict[str, object] = {"query": " ".join(query)}
+    if not isinstance(found, Exception):
+        result["path"] = str(found)
+        return result
+    result["error"] = type(found).__name__
+    result["message"] = str(found)
+    if isinstance(found, TryAgain):
+        result["possibles"] = [str(_) for _ in found.possibles]
+    return result
+
+
+def complete(args=None):
+    """Show paths in history which complete the last dirname in args
+
+    Or all paths in history, if there are no dirnames
+    """
+    words = [_ for _ in getattr(args, "dirnames", None) or [] if _ != "."]
+    if words:
+        paths_ = completions(words[-1])
+    else:
+        paths_ = [path for _rank, path, _time in read_history()]
+    for path in paths_:
         stdout(path)
     raise SystemExit(os.EX_OK)
 
@@ -524,37 +685,92 @@ def set_args_directory(args):
 
 def _path_to_config():
     """Path where our config files are kept"""
-    stem = paths.path(__file__).namebase
-    config = paths.home() / f".config/{stem}"
-    if not config.isdir():
-        os.makedirs(str(config))
-    return config
+    stem = os.path.splitext(os.path.basename(__file__))[0]
+    path_to_config = os.path.join(os.path.expanduser("~"), ".config", stem)
+    if not os.path.isdir(path_to_config):
+        os.makedirs(path_to_config)
+    return path_to_config
 
 
 def _path_to_history():
     """Path to where history of paths is stored"""
     path_to_config = _path_to_config()
-    return path_to_config / "history"
+    return os.path.join(path_to_config, "history")
+
+
+def _path_to_socket():
+    """Path to where a cde server listens"""
+    path_to_config = _path_to_config()
+    return os.path.join(path_to_config, "socket")
+
+
+def _path_to_sqlite():
+    """Path to where history is stored, once migrated to SQLite"""
+    path_to_config = _path_to_config()
+    return os.path.join(path_to_config, "history.sqlite")
+
+
+def _path_to_tree():
+    """Path to where the index of directories is stored"""
+    path_to_config = _path_to_config()
+    return os.path.join(path_to_config, "tree.sqlite")
+
+
+def _path_to_completions():
+    """Path to where the cache of completions is stored"""
+    path_to_config = _path_to_config()
+    return os.path.join(path_to_config, "completions")
+
+
+def _path_to_commands():
+    """Path to where listings of directories in $PATH are stored"""
+    path_to_config = _path_to_config()
+    return os.path.join(path_to_config, "commands.json")
+
+
+def _path_to_resolved():
+    """Path to where remembered lookups are stored"""
+    path_to_config = _path_to_config()
+    return os.path.join(path_to_config, "resolved.json")
+
+
+def _history_signature():
+    return history.signature(_path_to_history(), _path_to_sqlite())
+
+
+def _resolved() -> resolved.Resolved:
+    """Lookups remembered from before"""
+    size = int(config.number("cache_size"))
+    return resolved.Resolved(_path_to_resolved(), _history_signature(), size)
+
+
+def _directory_tree():
+    """The index of directories, if one has been made"""
+    return tree.tree(_path_to_tree())
+
+
+def _history():
+    """History of paths, read (at most) once per change"""
+    return history.history(_path_to_history(), _path_to_sqlite())
 
 
 def read_history():
     """Recall remembered paths"""
-    path = _path_to_history()
-    if not path.isfile():
-        return []
-    with open(path, "r") as stream:
-        reader = csv.reader(
-            stream, delimiter=",", quotechar='"', quoting=csv.QUOTE_MINIMAL
-        )
-        return [_ for _ in reader if _]
+    return list(_history().items())
 
 
-def sort_history(history):
-    def as_key(arg):
-        rank, path, time = arg
-        return (rank, time, path)
+def completions(word: str) -> List[str]:
+    """Paths in history which complete that word, most frecent first
 
-    return sorted(history, key=as_key)
+    They come from a cache, which is remade when history changes
+    """
+    return completion.completions(
+        word,
+        _path_to_completions(),
+        _history_signature(),
+        lambda: [path for _rank, path, _time in _history().frecent()],
+        int(config.number("menu_size")),
+    )
 
 
 def sorted_history():
@@ -562,8 +778,7 @@ def sorted_history():
 
     Sorted by ascending rank, descending time
     """
-    history = read_history()
-    return sort_history(history)
+    return _history().sorted()
 
 
 def frecent_history():
@@ -571,53 +786,27 @@ def frecent_history():
 
     Sorted by descending rank, ascending time
     """
-    return reversed(sorted_history())
+    return _history().frecent()
 
 
 def frecent_history_paths():
-    """A list of paths, sorted from history"""
-    return [paths.path(p) for _rank, p, _time in frecent_history()]
-
-
-def increment(string):
-    """Add 1 to the int in that string
-
-    >>> increment('1') == '2'
-    True
-    """
-    return str(int(string) + 1)
-
-
-def include_new_path_in_items(history_items, new_path):
-    """Add the given path to the existing history
-
-    Or update it if already present"""
-    new_time = timings.now()
-    found = False
-    for old_rank, old_path, old_time in history_items:
-        if old_path == new_path:
-            yield increment(old_rank), old_path, new_time
-            found = True
-        else:
-            yield old_rank, old_path, old_time
-    if not found:
-        yield 1, paths.path(new_path), new_time
+    """Unique paths, sorted from history, and indexed"""
+    return _history().frecent_paths()
 
 
 def add_path(path_to_add):
     path_to_add = find_path_to_dir(path_to_add)
-    history_items = read_history()
-    items = include_new_path_in_items(history_items, path_to_add)
-    write_paths(items)
+    _history().visit(path_to_add)
+
+
+def batched_history():
+    """Hold writes to history, then write them once at the end"""
+    return _history().batch()
 
 
 def write_paths(paths_to_remember):
     """Write the given paths to the history file"""
-    with open(str(_path_to_history()), "w") as stream:
-        writer = csv.writer(
-            stream, delimiter=",", quotechar='"', quoting=csv.QUOTE_MINIMAL
-        )
-        writer.writerows(paths_to_remember)
+    _history().write(paths_to_remember)
 
 
 def quietly(_args=None):
@@ -637,53 +826,126 @@ def QUIETLY(_args=None):
 
 
 def purge(_args=None):
-    """Delete the given path from the history"""
-    history_items = read_history()
-    new_items, changed = keep_existing_paths(history_items)
-    if changed:
-        write_paths(new_items)
+    """Delete all non-existent paths from the history
 
-
-def keep_existing_paths(history_items):
-    new_items = []
-    changed = False
-    for rank, path, time in history_items:
-        if not os.path.exists(path):
-            changed = True
-        else:
-            new_items.append((rank, path, time))
-    return new_items, changed
+    This checks every path, so is not done while looking for a path
+        Run it from a timer, or leave it to a cde server
+    """
+    lost_paths = [p for _rank, p, _time in read_history() if not os.path.exists(p)]
+    if lost_paths:
+        _history().forget(lost_paths)
 
 
 def rewrite_history_without_path(cde_path):
     """Delete the given path from the history"""
-    history_items = read_history()
-    new_items, changed = exclude_path_from_items(history_items, cde_path)
-    if changed:
-        write_paths(new_items)
+    _history().forget([cde_path])
 
 
-def exclude_path_from_items(history_items, cde_path):
-    new_items = []
-    changed = False
-    for rank, path, time in history_items:
-        if path == cde_path:
-            changed = True
-        else:
-            new_items.append((rank, path, time))
-    return new_items, changed
+def migrate(_args=None):
+    """Move history from the CSV file to an SQLite database"""
+    migrated = history.migrate(_path_to_history(), _path_to_sqlite())
+    stdout(f"Migrated {migrated} paths to {_path_to_sqlite()}")
+    raise SystemExit(os.EX_OK)
+
+
+def refresh(_args=None):
+    """Index directories under the index_roots setting (see cde.config)
+
+    Only directories which have changed since the last refresh are listed
+    """
+    roots = config.strings("index_roots")
+    if not roots:
+        stderr("Error: no index_roots are set in ~/.config/cde/config")
+        raise SystemExit(1)
+    depth = int(config.number("index_depth"))
+    tree_ = tree.DirectoryTree(_path_to_tree())
+    listed = tree_.refresh(roots, depth, indexable())
+    stdout(f"Listed {listed} directories under {':'.join(roots)}")
+    raise SystemExit(os.EX_OK)
+
+
+def indexable() -> Callable[[str], bool]:
+    """Whether a directory of that name is indexed, i.e. neither hidden nor pruned"""
+    is_pruned = prune.matcher()
+    return lambda name: not hidden(name) and not is_pruned(name)
+
+
+def watcher():
+    """A watcher to keep the index of directories, and history, current
+
+    The index is kept only if there are index_roots (see cde.config)
+    """
+    from cde import watch as watch_
+
+    roots = config.strings("index_roots")
+    return watch_.Watcher(
+        tree.DirectoryTree(_path_to_tree()) if roots else None,
+        roots,
+        int(config.number("index_depth")),
+        indexable(),
+        lambda: [path for _rank, path, _time in read_history()],
+        lambda lost_paths: _history().forget(lost_paths),
+    )
 
 
+def watch(_args=None):
+    """Keep the index of directories, and history, current until interrupted
+
+    Instead of refreshing the index, and purging history, from time to time
+    """
+    try:
+        watcher().run()
+    except KeyboardInterrupt:
+        pass
+    raise SystemExit(os.EX_OK)
+
+
+def profile(_args=None):
+    """Trace this lookup to stderr"""
+    trace.profile()
+
+
+def stats(_args=None):
+    """Show the slowest stages of lookups in the trace log"""
+    path_to_log = config.setting("trace")
+    if path_to_log in ("", "-"):
+        stderr("Error: the trace setting is not a log file (see cde.config)")
+        raise SystemExit(1)
+    try:
+        traces = trace.read(path_to_log)
+    except FileNotFoundError:
+        traces = []
+    for line in trace.summary(traces):
+        stdout(line)
+    raise SystemExit(os.EX_OK)
+
+
+@trace.staged
 def find_in_history(dir_: str, sub_dirs: List[str]):
     """If the given dir_ and sub_dirs are in the history return that path
 
     Otherwise None
+
+    Only paths which match are checked for existence
+        any found to be lost are removed from history
     """
-    frecent_paths = unique(frecent_history_paths())
     try:
-        return frecent_paths[int(dir_) - 1]
+        i = int(dir_) - 1
     except ValueError:
-        return _find_in_paths(dir_, sub_dirs, frecent_paths)
+        history_ = _history()
+        named_items = history_.named(dir_)
+        if named_items:
+            frecent_paths = iterutils.unique(p for _, p, _ in named_items)
+        else:
+            frecent_paths = frecent_history_paths()
+        lost: List[str] = []
+        try:
+            return _find_in_paths(dir_, sub_dirs, frecent_paths, lost)
+        finally:
+            if lost and not listings.cancelled():
+                history_.forget(lost)
+    frecent_paths = frecent_history_paths()
+    return paths.path(frecent_paths[i])
 
 
 def frecent_matchers(dir_: str) -> List[Callable[[str], bool]]:
@@ -705,13 +967,13 @@ def frecent_matchers(dir_: str) -> List[Callable[[str], bool]]:
         return dir_ in str(p)
 
     def same_base(p):
-        return dir_ == p.basename()
+        return dir_ == os.path.basename(p)
 
     def glob_base(p):
-        return globbed(p.basename())
+        return globbed(os.path.basename(p))
 
     def glob_base_glob(p):
-        return globbed(f"*{p.basename()}")
+        return globbed(f"*{os.path.basename(p)}")
 
     def ancestor(p):
         return dir_ in p.split(os.path.sep)
@@ -734,14 +996,58 @@ def frecent_matchers(dir_: str) -> List[Callable[[str], bool]]:
     return result
 
 
-def frecently_matched(dir_: str, frecent_paths):
+def matched_by(matcher, dir_: str, indexed_paths: IndexedPaths) -> Iterator:
+    """Paths which that matcher matches for dir_, in order
+
+    From an index of the paths, if it can, otherwise by scanning them
+        a scan stops when the caller stops taking paths
+    """
+    indexed = indexed_paths.matching(matcher.__name__, dir_)
+    if indexed is not None:
+        yield from indexed
+        return
+    for path_ in indexed_paths:
+        trace.count("matcher_scans")
+        if matcher(path_):
+            yield path_
+
+
+def frecently_matched(dir_: str, frecent_paths, lost=None, limit: int = 0):
+    """Paths matched by the first matcher which matches any
+
+    Matchers look in an index of the paths, if they can
+        otherwise they scan paths until they have matched limit paths
+        or all paths, if limit is 0
+
+    Matched paths which no longer exist are added to lost, if given
+    """
+    indexed_paths = IndexedPaths.of(frecent_paths)
+    exists = listings.current().exists
     for matcher in frecent_matchers(dir_):
-        paths = [_ for _ in frecent_paths if matcher(_)]
-        if paths:
-            return UniquePaths(paths)
+        trace.count("matchers")
+        matched, any_matched = UniquePaths([]), False
+        for path_ in matched_by(matcher, dir_, indexed_paths):
+            any_matched = True
+            if not exists(path_):
+                if lost is not None:
+                    lost.append(str(path_))
+                continue
+            matched.append(path_)
+            if len(matched) == limit:
+                break
+        if any_matched:
+            return matched
     return UniquePaths([])
 
 
+def menu_size(i: Optional[int] = None) -> int:
+    """How many matches to collect, enough to offer a menu, or to choose i
+
+    >>> assert menu_size(99) == 100
+    """
+    return max(int(config.number("menu_size")), 0 if i is None else i + 1)
+
+
 def possible_i(possibilities, i):
     try:
         return possibilities[i]
@@ -752,7 +1058,7 @@ def possible_i(possibilities, i):
 
 
 def _find_in_paths(
-    dir_: str, sub_dirs: List[str], frecent_paths: List[str]
+    dir_: str, sub_dirs: List[str], frecent_paths: List[str], lost=None
 ) -> Optional[paths.StringPath]:
     """Get the first of those paths which meets one of the criteria:
 
@@ -764,10 +1070,13 @@ def _find_in_paths(
     6. has a parent with same basename as "dir_*"
 
     paths are assumed to be ordered, so first matching path wins
+        and only the first menu_size() matching paths are considered
+    Any matching paths which no longer exist are added to lost, if given
     """
     possibles = UniquePaths([])
-    matched = frecently_matched(dir_, frecent_paths)
+    sub_dirs = list(sub_dirs)
     i = take_first_integer(sub_dirs)
+    matched = frecently_matched(dir_, frecent_paths, lost, menu_size(i))
     if not sub_dirs:
         possibles.extend(matched)
     elif len(matched) == 1:
@@ -781,7 +1090,10 @@ def _find_in_paths(
             raise RangeError(i, matched)
         possibles.extend(possibles_under_directory(match_, sub_dirs))
     elif len(matched) > 1:
-        [possibles.extend(possibles_under_directory(_, sub_dirs)) for _ in set(matched)]
+        for found in fanned_out(
+            lambda p: possibles_under_directory(p, sub_dirs), iterutils.unique(matched)
+        ):
+            possibles.extend(found)
     possibilities = PossiblePaths(possibles)
     if not possibilities:
         return None
@@ -851,8 +1163,92 @@ def cde(dir_: str, sub_dirs: List[str]):
     >>> _ = cde('/', ['us', 'lo'])
     /usr/local
     """
-    cde_path = find_directory(dir_, sub_dirs)
-    return show_found_item(cde_path)
+    (found,) = find_all([[dir_, *sub_dirs]])
+    if isinstance(found, Exception):
+        raise found
+    stdout(str(found))
+    return True
+
+
+def find_all(queries: List[List[str]]) -> list:
+    """Find a directory for each query, of a dir_ and its sub_dirs
+
+    Give the path found for each, or the error raised
+        only ToDo and TryAgain errors are remembered
+
+    History is read once, and written (at most) once
+        after all paths are found, so all are found in the same history
+    Each directory is listed (at most) once, and the config file read once
+    And lookups are remembered, for when they are repeated (see cde.resolved)
+        unless they ran out of budget (see cde.budget)
+        those which found nothing with the directories listed, to check later
+    """
+    resolved_ = _resolved()
+    rewrites = _history().rewrites
+    try:
+        with listings.fresh(), config.once():
+            results, spent = [], []
+            for dir_, *sub_dirs in queries:
+                with budget.spending() as spending:
+                    results.append(find_one(resolved_, dir_, sub_dirs))
+                spent.append(spending.spent)
+            keys = [resolved_.key(dir_, sub_dirs) for dir_, *sub_dirs in queries]
+            listed = None
+            for (dir_, *_), key, result, spent_ in zip(queries, keys, results, spent):
+                if dir_ == "-" or spent_:
+                    # Depends on $OLDPWD, or on how long the search took
+                    continue
+                if isinstance(result, (ToDo, TryAgain)):
+                    if listed is None:
+                        listed = resolved.mtimes(listings.current().listed())
+                    resolved_.remember(key, error=result, listed=listed)
+                elif not isinstance(result, Exception):
+                    resolved_.remember(key, found=str(result))
+            found = [
+                (k, r) for k, r in zip(keys, results) if not isinstance(r, Exception)
+            ]
+            with batched_history():
+                for key, path_ in found:
+                    add_path(path_)
+                    resolved_.visited(str(path_), key)
+        return results
+    finally:
+        if _history().rewrites != rewrites:
+            resolved_.forget()
+        resolved_.write(_history_signature())
+
+
+def find_one(resolved_: resolved.Resolved, dir_: str, sub_dirs: List[str]):
+    """The path found for dir_ and sub_dirs, or the error raised
+
+    Errors are given, not raised, so one query cannot stop the others
+    """
+    with trace.resolving([dir_, *sub_dirs]) as trace_:
+        try:
+            cde_path = None
+            if dir_ != "-":
+                cde_path = remembered(resolved_, resolved_.key(dir_, sub_dirs))
+            cde_path = cde_path or find_directory(dir_, sub_dirs)
+        except Exception as e:
+            if trace_:
+                trace_.error = type(e).__name__
+            return e
+        if trace_:
+            trace_.found = str(cde_path)
+        return cde_path
+
+
+def remembered(resolved_: resolved.Resolved, key: str) -> Optional[paths.StringPath]:
+    """What that lookup found before, raising any error it raised, or None"""
+    lookup = resolved_.get(key)
+    if not lookup:
+        return None
+    trace.count("remembered")
+    if lookup["found"]:
+        return paths.path(lookup["found"])
+    if lookup["error"] == "TryAgain":
+        raise TryAgain([paths.path(_) for _ in lookup["possibles"]])
+    raise ToDo(lookup["message"])
 
 
 def show_paths():
@@ -0,0 +1,117 @@
+"""Find which directory in $PATH has a command, as "which" would
+
+Listings of the files in each directory in $PATH are kept in a JSON file
+    with the mtime of each directory, and an index of which directory has a name
+A directory is listed again only when its mtime changes
+    and the index is remade when any listing, or $PATH, changes
+So each lookup needs one stat per directory, and one dictionary lookup
+"""
+
+import json
+import os
+import tempfile
+from typing import Dict
+from typing import List
+from typing import Optional
+
+from cde import listings
+from cde import trace
+
+
+def _names_of_files(path_to_dir: str) -> List[str]:
+    trace.count("listdirs")
+    names = []
+    try:
+        with os.scandir(path_to_dir) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file():
+                        names.append(entry.name)
+                except OSError:
+                    continue
+    except OSError:
+        pass
+    return names
+
+
+class Commands:
+    """Files in the directories of a $PATH, kept in a file between lookups"""
+
+    def __init__(self, path_to_file: str, environ_path: str):
+        self.path = str(path_to_file)
+        self.environ_path = environ_path
+        self.directories = [_ for _ in environ_path.split(os.pathsep) if _]
+        self.listings: Dict[str, list] = {}
+        self.index: Dict[str, str] = {}
+        self._data = self._read()
+        if self._refresh() and self._as_data() != self._data:
+            self._write()
+
+    def _read(self) -> Optional[dict]:
+        try:
+            with open(self.path) as stream:
+                data = json.load(stream)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(data, dict):
+            return None
+        self.listings = data.get("listings", {})
+        if data.get("PATH") == self.environ_path:
+            self.index = data.get("index", {})
+        return data
+
+    def _refresh(self) -> bool:
+        """List directories which have changed, and index them if any had
+
+        Listings of directories no longer in $PATH are dropped
+        Give whether anything changed
+        """
+        changed = not self._data or self._data.get("PATH") != self.environ_path
+        if set(self.listings) - set(self.directories):
+            self.listings = {
+                _: self.listings[_] for _ in self.directories if _ in self.listings
+            }
+            changed = True
+        for path_to_dir in self.directories:
+            stat = listings.current().stat(path_to_dir)
+            mtime = stat.st_mtime_ns if stat else None
+            listing = self.listings.get(path_to_dir)
+            if not listing or listing[0] != mtime:
+                names = _names_of_files(path_to_dir) if mtime else []
+                self.listings[path_to_dir] = [mtime, names]
+                changed = True
+        if changed:
+            self.index = {}
+            for path_to_dir in self.directories:
+                for name in self.listings[path_to_dir][1]:
+                    self.index.setdefault(name, path_to_dir)
+        return changed
+
+    def _as_data(self) -> dict:
+        return {
+            "PATH": self.environ_path,
+            "listings": self.listings,
+            "index": self.index,
+        }
+
+    def _write(self) -> None:
+        """Keep the listings, unless they cannot be kept"""
+        data = self._as_data()
+        path_to_dir = os.path.dirname(os.path.abspath(self.path))
+        try:
+            handle, path_to_temp = tempfile.mkstemp(
+                dir=path_to_dir, prefix=".commands."
+            )
+        except OSError:
+            return
+        try:
+            with os.fdopen(handle, "w") as stream:
+                json.dump(data, stream)
+            os.replace(path_to_temp, self.path)
+        except BaseException:
+            os.remove(path_to_temp)
+            raise
+
+    def directory(self, name: str) -> Optional[str]:
+        """The first directory in $PATH with a file of that name, if any"""
+        return self.index.get(name)
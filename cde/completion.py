@@ -0,0 +1,157 @@
+"""Complete partial directory names from history, quickly enough for Tab
+
+Shells ask for completions on every Tab, so they come from a cache
+    which has a line for each word (basename, or other component) in history
+    giving the most frecent paths with that word, and their frecent ranks
+Lines are in order of their most frecent path
+    so a search can stop once no later line could have a more frecent path
+A completion reads the cache and searches it, without looking at paths
+    it should take no more than a few milliseconds after Python has started
+    even for histories of 100,000 paths (see benchmarks/resolution.py)
+
+The cache is remade when history changes
+    its first line is the signature of the history it was made from
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import tempfile
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+
+
+def words(path: str) -> List[str]:
+    """Words which would complete to that path
+
+    >>> words('/usr/local/bin')
+    ['usr', 'local', 'bin']
+    """
+    return [_ for _ in path.split(os.path.sep) if _]
+
+
+def as_text(paths_: Iterable[str], limit: int) -> str:
+    """Lines of each word in those paths, with up to limit paths for each
+
+    >>> print(as_text(['/usr/bin', '/bin'], 9))
+    <BLANKLINE>
+    usr	0:/usr/bin
+    bin	0:/usr/bin	1:/bin
+    """
+    ranks: Dict[str, List[int]] = {}
+    paths_ = [_ for _ in paths_ if "\t" not in _ and "\n" not in _]
+    for rank, path in enumerate(paths_):
+        for word in words(path):
+            ranked = ranks.setdefault(word, [])
+            if not ranked or ranked[-1] != rank and len(ranked) != limit:
+                ranked.append(rank)
+    return "".join(
+        "\n" + "\t".join([word] + [f"{_}:{paths_[_]}" for _ in ranked])
+        for word, ranked in sorted(ranks.items(), key=lambda x: x[1][0])
+    )
+
+
+def key(signature, limit: int) -> str:
+    """The first line of a cache, for history with that signature"""
+    return f"{signature!r} {limit}"
+
+
+def read(path_to_cache: str, signature, limit: int) -> Optional[str]:
+    """The cached lines, or None if there are none for history of that signature"""
+    first_line = key(signature, limit)
+    try:
+        with open(path_to_cache) as stream:
+            text = stream.read()
+    except FileNotFoundError:
+        return None
+    if text != first_line and not text.startswith(f"{first_line}\n"):
+        return None
+    return text[len(first_line) :]
+
+
+def write(path_to_cache: str, signature, limit: int, paths_: Iterable[str]) -> str:
+    """Replace the cache with lines for those paths, giving the lines"""
+    text = as_text(paths_, limit)
+    path_to_dir = os.path.dirname(os.path.abspath(path_to_cache))
+    handle, path_to_temp = tempfile.mkstemp(dir=path_to_dir, prefix=".completions.")
+    try:
+        with os.fdopen(handle, "w") as stream:
+            stream.write(f"{key(signature, limit)}{text}")
+        os.replace(path_to_temp, path_to_cache)
+    except BaseException:
+        os.remove(path_to_temp)
+        raise
+    return text
+
+
+def prefixed(word: str) -> re.Pattern:
+    """Match lines whose word starts with that word"""
+    return re.compile(rf"\n{re.escape(word)}[^\t\n]*\t([^\n]*)")
+
+
+def fuzzy(word: str) -> re.Pattern:
+    """Match lines whose word has the characters of that word, in order
+
+    Each character is matched at its first place, so nothing is backtracked
+
+    >>> assert fuzzy('lcl').search('\\nlocal\\t0:/usr/local')
+    >>> assert not fuzzy('lcl').search('\\nlib\\t0:/usr/lib')
+    """
+    characters = "".join(f"[^\t\n{re.escape(_)}]*{re.escape(_)}" for _ in word)
+    return re.compile(rf"\n{characters}[^\t\n]*\t([^\n]*)", re.IGNORECASE)
+
+
+def most_frecent(matches: Iterator[re.Match], limit: int) -> List[str]:
+    """The limit most frecent paths on those lines
+
+    Once a line's most frecent path is less frecent than limit paths
+        already found, no line after it can have any more frecent
+    """
+    found: Dict[int, str] = {}
+    for match in matches:
+        entries = [_.split(":", 1) for _ in match.group(1).split("\t")]
+        if limit and len(found) == limit and int(entries[0][0]) > max(found):
+            break
+        found.update((int(rank), path) for rank, path in entries)
+        found = {_: found[_] for _ in sorted(found)[: limit or None]}
+    return [found[_] for _ in sorted(found)]
+
+
+def search(word: str, text: str, limit: int) -> List[str]:
+    """Paths in text with words which start with that word, most frecent first
+
+    Or, if there are none, with words which have its characters in order
+
+    >>> text = as_text(['/usr/local/bin', '/usr/lib'], 9)
+    >>> search('li', text, 9)
+    ['/usr/lib']
+    >>> search('lcl', text, 9)
+    ['/usr/local/bin']
+    """
+    for pattern in (prefixed(word), fuzzy(word)):
+        found = most_frecent(pattern.finditer(text), limit)
+        if found:
+            return found
+    return []
+
+
+def completions(
+    word: str,
+    path_to_cache: str,
+    signature,
+    frecent_paths: Callable[[], Iterable[str]],
+    limit: int,
+) -> List[str]:
+    """Paths which complete that word, at most limit of them
+
+    The cache is remade from frecent_paths() if history's signature has changed
+    """
+    text = read(path_to_cache, signature, limit)
+    if text is None:
+        text = write(path_to_cache, signature, limit, frecent_paths())
+    return search(word, text, limit)
@@ -0,0 +1,138 @@
+"""Settings for cde
+
+Settings are read from ~/.config/cde/config, which looks like
+    [cde]
+    purge_interval = 86400
+    index_roots = ~:/usr/local
+
+Any setting can be overridden by an environment variable
+    e.g. CDE_PURGE_INTERVAL=3600
+
+The file is checked for changes whenever a setting is read
+    except within once(), e.g. for one lookup, where it is read once
+"""
+
+import configparser
+import contextlib
+import os
+from functools import lru_cache
+from typing import Iterator
+from typing import List
+from typing import Optional
+
+defaults = {
+    # Seconds between purges of lost paths by a cde server, 0 for never
+    "purge_interval": "86400",
+    # Whether a cde server watches for changes to directories, instead of purging
+    "watch": "0",
+    # Directories (":"-separated) under which to index sub-directories
+    "index_roots": "",
+    # How many levels under those roots to index
+    "index_depth": "6",
+    # Threads to look under several directories at once, 1 for no threads
+    "workers": "8",
+    # Where to log traces of lookups, "-" for stderr, "" for nowhere
+    "trace": "",
+    # Bytes of visits to journal before merging them into the history file
+    "journal_size": "65536",
+    # Seconds after which a visit to a directory counts half as much
+    "half_life": "604800",
+    # Most matches from history to look under, or to offer as choices
+    "menu_size": "20",
+    # How many lookups to remember, 0 to remember none
+    "cache_size": "128",
+    # Whether to try all ways of finding a directory at once, 0 for one by one
+    "race": "0",
+    # Seconds a search under here, or at home, may take, 0 for no limit
+    "search_seconds": "2",
+    # How many levels below here, or home, to search
+    "search_depth": "12",
+    # How many directories to list in one search
+    "search_directories": "20000",
+    # Directories (":"-separated globs) never to look in, unless named exactly
+    "prune": (
+        ".git:.hg:.svn:.tox:.venv:venv:node_modules:__pycache__:"
+        ".mypy_cache:.pytest_cache:*.egg*:build:htmlcov"
+    ),
+}
+
+
+def path_to_config() -> str:
+    return os.path.expanduser("~/.config/cde/config")
+
+
+@lru_cache(maxsize=4)
+def _parse(path_to_file: str, _signature) -> dict:
+    parser = configparser.ConfigParser()
+    parser.read(path_to_file)
+    return dict(parser["cde"]) if parser.has_section("cde") else {}
+
+
+_once: Optional[dict] = None
+
+
+@contextlib.contextmanager
+def once() -> Iterator[dict]:
+    """Read the config file once, for every setting read in this block
+
+    >>> with once() as settings:
+    ...     assert _settings() is settings
+    >>> assert _once is None
+    """
+    global _once
+    previous = _once
+    _once = _read() if previous is None else previous
+    try:
+        yield _once
+    finally:
+        _once = previous
+
+
+def _settings() -> dict:
+    if _once is not None:
+        return _once
+    return _read()
+
+
+def _read() -> dict:
+    path_to_file = path_to_config()
+    try:
+        stat = os.stat(path_to_file)
+    except FileNotFoundError:
+        return {}
+    return _parse(path_to_file, (stat.st_mtime_ns, stat.st_size))
+
+
+def setting(name: str) -> str:
+    """The value of that setting, from environment, config file, or default
+
+    >>> assert setting('purge_interval').isdigit()
+    """
+    try:
+        return os.environ[f"CDE_{name.upper()}"]
+    except KeyError:
+        pass
+    try:
+        return _settings()[name]
+    except KeyError:
+        return defaults[name]
+
+
+def number(name: str) -> float:
+    """The value of that setting, as a number
+
+    >>> os.environ['CDE_PURGE_INTERVAL'] = '60'
+    >>> assert number('purge_interval') == 60
+    >>> del os.environ['CDE_PURGE_INTERVAL']
+    """
+    return float(setting(name))
+
+
+def strings(name: str) -> List[str]:
+    """The value of that setting, as a list of ":"-separated strings
+
+    >>> os.environ['CDE_INDEX_ROOTS'] = '~:/usr'
+    >>> assert strings('index_roots') == ['~', '/usr']
+    >>> del os.environ['CDE_INDEX_ROOTS']
+    """
+    return [_ for _ in setting(name).split(os.pathsep) if _]
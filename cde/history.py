@@ -0,0 +1,691 @@
+"""Stores for the history of paths cde has been to
+
+Each item of history is a rank, a path and a time
+    The rank counts visits, the time is of the latest one
+Stores also keep a frecency score for each path (see frecency())
+    which is updated on each visit, and orders the frecent items
+    with the half-life the scores were made with
+    so all are scored again if that setting changes
+
+A History reads its store once, and remembers what it read
+    until the store's file changes
+
+A CSV file is the default store
+    visits are appended to a journal, which is merged in when it grows
+    other changes rewrite the file
+    changes are made under a lock, so that concurrent changes are not lost
+    and the file is replaced whole, so readers never see part of it
+An SQLite database can be used instead (see migrate())
+    which is indexed by path and by basename
+    and updates only the rows which change
+"""
+
+from __future__ import annotations
+
+import csv
+import fcntl
+import heapq
+import io
+import math
+import os
+import sys
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+from typing import Union
+
+from cde import config
+from cde import lazy
+from cde import timings
+from cde import trace
+from cde.index import IndexedPaths
+
+if TYPE_CHECKING:
+    import sqlite3
+    from boltons import iterutils
+else:
+    sqlite3 = lazy.module("sqlite3")
+    iterutils = lazy.module("boltons.iterutils")
+
+
+def increment(string):
+    """Add 1 to the int in that string
+
+    >>> increment('1') == '2'
+    True
+    """
+    return str(int(string) + 1)
+
+
+def half_life() -> float:
+    """Seconds after which a visit counts half as much (see cde.config)"""
+    return config.number("half_life")
+
+
+def frecency(rank, time, half_life_: float = 0) -> float:
+    """A score for rank visits, all at that time
+
+    A visit scores 1 when it is made, and halves every half_life()
+        a path's frecency is the sum of scores of all visits to it
+    That is kept as log2(sum * 2 ** (now / half_life)), which does not
+        change as time passes, so paths stay in the same order
+
+    Callers scoring many items can give the half-life, read once
+
+    >>> assert frecency(2, 0) == frecency(1, half_life())
+    >>> assert frecency(2, 0, 10) == frecency(1, 10, 10)
+    """
+    return float(time) / (half_life_ or half_life()) + math.log2(max(int(rank), 1))
+
+
+def visited(score, time, half_life_: float = 0) -> float:
+    """That frecency score, after another visit at that time
+
+    >>> assert visited(frecency(1, 0), 0) == frecency(2, 0)
+    """
+    old, new = float(score), frecency(1, time, half_life_)
+    return max(old, new) + math.log2(1 + 2 ** -abs(old - new))
+
+
+def scored(item, half_life_: float = 0) -> list:
+    """The item as a rank, path, time and frecency score
+
+    Items without a score are given one as if all visits were at its time
+    """
+    rank, path, time, *score = item
+    score_ = score[0] if score else frecency(rank, time, half_life_)
+    return [str(rank), str(path), str(time), str(score_)]
+
+
+def include_visits_in_items(history_items, visits) -> List[list]:
+    """Count those visits (each a path and a time) in the history
+
+    >>> items = [['1', '/usr', '0']]
+    >>> visits = [['/usr', '5'], ['/bin', '6']]
+    >>> [_[:3] for _ in include_visits_in_items(items, visits)]
+    [['2', '/usr', '5'], ['1', '/bin', '6']]
+    """
+    half_life_ = half_life()
+    items = [scored(_, half_life_) for _ in history_items]
+    positions = {path: i for i, (_, path, _, _) in enumerate(items)}
+    for path, time in visits:
+        try:
+            item = items[positions[path]]
+            item[0], item[2] = increment(item[0]), time
+            item[3] = str(visited(item[3], time, half_life_))
+        except KeyError:
+            positions[path] = len(items)
+            items.append(scored(["1", path, time], half_life_))
+    return items
+
+
+def journalled(rows) -> List[list]:
+    """The visits in those rows of a journal, each a path and a time
+
+    A visit cut short by a crash leaves a row which is not [path, time]
+
+    >>> journalled([['/usr', '5'], ['/usr/lo'], ['/bin', '6', '7'], ['/etc', '8.']])
+    [['/usr', '5'], ['/etc', '8.']]
+    >>> journalled([['/usr', '5/etc']])
+    []
+    """
+    visits = []
+    for row in rows:
+        if len(row) != 2:
+            continue
+        try:
+            float(row[1])
+        except ValueError:
+            continue
+        visits.append(row)
+    return visits
+
+
+def sort_history(history):
+    """Items sorted by ascending frecency
+
+    >>> items = [['9', '/usr', '0'], ['10', '/bin', '0']]
+    >>> [p for _, p, _ in sort_history(items)]
+    ['/usr', '/bin']
+    """
+    half_life_ = half_life()
+    return sorted(history, key=lambda item: float(scored(item, half_life_)[3]))
+
+
+def exclude_path_from_items(history_items, cde_path):
+    new_items = []
+    changed = False
+    for rank, path, time in history_items:
+        if path == cde_path:
+            changed = True
+        else:
+            new_items.append((rank, path, time))
+    return new_items, changed
+
+
+def file_signature(path_to_file: str) -> Optional[Tuple[int, int]]:
+    """Modification time and size of that file, which change when it is written
+
+    Or None if there is no file
+    """
+    try:
+        stat = os.stat(path_to_file)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class Entry:
+    """An item of history, kept compactly
+
+    Rank and time are numbers, the path is split once into its components
+        and the path and components are interned, so are shared with other entries
+
+    >>> rank, path, time = Entry('2', '/usr/bin', '0.5')
+    >>> assert rank == 2 and time == 0.5
+    >>> assert Entry(rank, path, time).basename is Entry(rank, '/bin', time).basename
+    """
+
+    __slots__ = ("rank", "path", "time", "parts", "basename")
+
+    def __init__(self, rank, path, time, *_score):
+        self.rank = int(rank)
+        self.path = sys.intern(str(path))
+        self.time = float(time)
+        self.parts = tuple(map(sys.intern, self.path.split(os.path.sep)))
+        self.basename = self.parts[-1]
+
+    def __iter__(self):
+        return iter((self.rank, self.path, self.time))
+
+    def __repr__(self):
+        return f"Entry({self.rank!r}, {self.path!r}, {self.time!r})"
+
+
+class CsvHistory:
+    """History kept in a CSV file, with visits appended to a journal
+
+    The journal is merged into the file when it is bigger than
+        the journal_size setting (see cde.config)
+    Other changes rewrite the file whole, and empty the journal
+    The file is written most frecent first
+        after a header row with the half-life its scores were made with
+
+    Reads share a lock file, changes hold it alone
+    """
+
+    indexed = False
+
+    def __init__(self, path_to_file):
+        self.path = str(path_to_file)
+        self.path_to_journal = f"{self.path}.journal"
+        self.path_to_lock = f"{self.path}.lock"
+        self._pending = None
+        self._batching = False
+        self._locked = False
+
+    def signature(self):
+        return file_signature(self.path), file_signature(self.path_to_journal)
+
+    @staticmethod
+    def _rows(path_to_file: str) -> List[list]:
+        if not os.path.isfile(path_to_file):
+            return []
+        with open(path_to_file, "r") as stream:
+            reader = csv.reader(
+                stream, delimiter=",", quotechar='"', quoting=csv.QUOTE_MINIMAL
+            )
+            return [_ for _ in reader if _]
+
+    @contextmanager
+    def locked(self, shared: bool = False):
+        """Hold the lock file, alone unless shared, until the end of this block"""
+        if self._locked:
+            yield
+            return
+        with open(self.path_to_lock, "a") as stream:
+            fcntl.flock(stream.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            self._locked = True
+            try:
+                yield
+            finally:
+                self._locked = False
+
+    def read(self) -> List[list]:
+        return [_[:3] for _ in self.rows()]
+
+    def rows(self) -> List[list]:
+        """Items, with their frecency scores"""
+        if self._pending is not None:
+            return list(self._pending)
+        with self.locked(shared=True):
+            return self._read()
+
+    def _read(self) -> List[list]:
+        return self._read_journalled()[0]
+
+    def _read_journalled(self) -> Tuple[List[list], set]:
+        """Scored items, and the paths which were visited in the journal"""
+        trace.count("history_reads")
+        rows = self._rows(self.path)
+        made_with = None
+        if rows and rows[0][0] == "half_life":
+            made_with = float(rows.pop(0)[1])
+        half_life_ = half_life()
+        if made_with == half_life_:
+            items = [_ if len(_) == 4 else scored(_, half_life_) for _ in rows]
+        else:
+            items = [scored(_[:3], half_life_) for _ in rows]
+        visits = journalled(self._rows(self.path_to_journal))
+        if not visits:
+            return items, set()
+        return include_visits_in_items(items, visits), {p for p, _ in visits}
+
+    def frecent(self) -> List[list]:
+        """Items, most frecent first
+
+        The file is kept in that order, so only visits in the journal are sorted
+        """
+        by_score = lambda row: -float(row[3])
+        if self._pending is not None:
+            return [_[:3] for _ in sorted(self._pending, key=by_score)]
+        with self.locked(shared=True):
+            rows, journalled = self._read_journalled()
+        kept = [_ for _ in rows if _[1] not in journalled]
+        if any(by_score(a) > by_score(b) for a, b in zip(kept, kept[1:])):
+            # Not written by this version of cde
+            kept.sort(key=by_score)
+        moved = sorted((_ for _ in rows if _[1] in journalled), key=by_score)
+        return [_[:3] for _ in heapq.merge(kept, moved, key=by_score)]
+
+    def write(self, items: Iterable) -> None:
+        if self._batching:
+            half_life_ = half_life()
+            self._pending = [scored(_, half_life_) for _ in items]
+            return
+        with self.locked():
+            self._write(items)
+
+    def _write(self, items: Iterable) -> None:
+        """Replace the file with those items, and empty the journal"""
+        half_life_ = half_life()
+        rows = sorted(
+            (scored(_, half_life_) for _ in items), key=lambda row: -float(row[3])
+        )
+        trace.count("history_writes")
+        path_to_dir = os.path.dirname(os.path.abspath(self.path))
+        handle, path_to_temp = tempfile.mkstemp(dir=path_to_dir, prefix=".history.")
+        try:
+            with trace.stage("history_write"), os.fdopen(handle, "w") as stream:
+                writer = csv.writer(
+                    stream, delimiter=",", quotechar='"', quoting=csv.QUOTE_MINIMAL
+                )
+                writer.writerow(["half_life", str(half_life_)])
+                writer.writerows(rows)
+            os.replace(path_to_temp, self.path)
+        except BaseException:
+            os.remove(path_to_temp)
+            raise
+        if os.path.isfile(self.path_to_journal):
+            os.remove(self.path_to_journal)
+
+    def visit(self, path: str) -> None:
+        """Append the visit to the journal, compacting it if it is big enough"""
+        now = str(timings.now())
+        if self._pending is not None:
+            self._pending = include_visits_in_items(self._pending, [[str(path), now]])
+            return
+        line = io.StringIO()
+        csv.writer(line, quoting=csv.QUOTE_MINIMAL).writerow([str(path), now])
+        trace.count("history_writes")
+        with self.locked():
+            with trace.stage("history_write"):
+                with open(self.path_to_journal, "ab+") as stream:
+                    size = stream.seek(0, os.SEEK_END)
+                    if size:
+                        # Do not add to a row cut short by a crash
+                        stream.seek(-1, os.SEEK_END)
+                        if stream.read(1) != b"\n":
+                            stream.write(b"\n")
+                    stream.write(line.getvalue().encode())
+                    size = stream.tell()
+            if size > config.number("journal_size"):
+                self._write(self._read())
+
+    def forget(self, paths_: Iterable[str]) -> None:
+        forgotten = {str(_) for _ in paths_}
+        if self._pending is not None:
+            self._pending = [_ for _ in self._pending if str(_[1]) not in forgotten]
+            return
+        with self.locked():
+            items = self._read()
+            kept = [_ for _ in items if _[1] not in forgotten]
+            if len(kept) < len(items):
+                self._write(kept)
+
+    def compact(self) -> None:
+        """Merge the journal into the file"""
+        with self.locked():
+            self._write(self._read())
+
+    @contextmanager
+    def batch(self):
+        """Hold writes in memory, then write them once at the end"""
+        if self._batching:
+            yield
+            return
+        self._batching = True
+        try:
+            yield
+        finally:
+            self._batching = False
+            if self._pending is not None:
+                items, self._pending = self._pending, None
+                self.write(items)
+
+
+class SqliteHistory:
+    """History kept in an SQLite database, indexed by path and basename"""
+
+    indexed = True
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS history (
+            path TEXT PRIMARY KEY,
+            basename TEXT NOT NULL,
+            rank INTEGER NOT NULL,
+            time REAL NOT NULL,
+            score REAL
+        );
+        CREATE INDEX IF NOT EXISTS history_basename ON history (basename);
+        CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value REAL);
+    """
+
+    # Rows are scored by _scoring(), before they are first ordered
+    scores = "CREATE INDEX IF NOT EXISTS history_score ON history (score);"
+
+    def __init__(self, path_to_file):
+        self.path = str(path_to_file)
+        # Threads take turns, through History
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.create_function("frecency", 3, frecency)
+        self.connection.create_function("visited", 3, visited)
+        self.connection.executescript(self.schema)
+        columns = [_[1] for _ in self.connection.execute("PRAGMA table_info(history)")]
+        if "score" not in columns:
+            # Made before scores were kept
+            self.connection.execute("ALTER TABLE history ADD COLUMN score REAL")
+        with self.connection:
+            self.connection.executescript(self.scores)
+        self._batching = False
+        self.half_life = self._made_with()
+
+    def _made_with(self) -> Optional[float]:
+        """The half-life which the scores were made with, if known"""
+        row = self.connection.execute(
+            "SELECT value FROM settings WHERE name = 'half_life'"
+        ).fetchone()
+        return row[0] if row else None
+
+    def _scoring(self) -> float:
+        """The half-life to score with, scoring all rows again if it has changed"""
+        half_life_ = half_life()
+        if half_life_ != self.half_life:
+            with self.changes():
+                self.connection.execute(
+                    "UPDATE history SET score = frecency(rank, time, ?)", (half_life_,)
+                )
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO settings VALUES ('half_life', ?)",
+                    (half_life_,),
+                )
+            self.half_life = half_life_
+        return half_life_
+
+    def signature(self):
+        return file_signature(self.path)
+
+    @staticmethod
+    def as_item(row) -> list:
+        rank, path, time = row
+        return [str(rank), path, str(time)]
+
+    def read(self) -> List[list]:
+        trace.count("history_reads")
+        rows = self.connection.execute("SELECT rank, path, time FROM history")
+        return [self.as_item(_) for _ in rows]
+
+    def frecent(self) -> List[list]:
+        self._scoring()
+        trace.count("history_reads")
+        rows = self.connection.execute(
+            "SELECT rank, path, time FROM history ORDER BY score DESC"
+        )
+        return [self.as_item(_) for _ in rows]
+
+    def write(self, items: Iterable) -> None:
+        half_life_ = self._scoring()
+        rows = [
+            (p, os.path.basename(p), int(r), float(t), float(s))
+            for r, p, t, s in (scored(_, half_life_) for _ in items)
+        ]
+        with self.changes():
+            self.connection.execute("DELETE FROM history")
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO history VALUES (?, ?, ?, ?, ?)", rows
+            )
+
+    def visit(self, path: str) -> None:
+        path_, now = str(path), timings.now()
+        half_life_ = self._scoring()
+        with self.changes():
+            self.connection.execute(
+                """INSERT INTO history VALUES (?, ?, 1, ?, ?)
+                ON CONFLICT (path)
+                DO UPDATE SET
+                    rank = rank + 1,
+                    time = excluded.time,
+                    score = visited(score, excluded.time, ?)""",
+                (
+                    path_,
+                    os.path.basename(path_),
+                    now,
+                    frecency(1, now, half_life_),
+                    half_life_,
+                ),
+            )
+
+    def forget(self, paths_: Iterable[str]) -> None:
+        with self.changes():
+            self.connection.executemany(
+                "DELETE FROM history WHERE path = ?", [(str(_),) for _ in paths_]
+            )
+
+    def named(self, name: str) -> List[list]:
+        self._scoring()
+        rows = self.connection.execute(
+            """SELECT rank, path, time FROM history
+            WHERE path = ? OR basename = ?
+            ORDER BY score DESC""",
+            (name, name),
+        )
+        return [self.as_item(_) for _ in rows]
+
+    @contextmanager
+    def changes(self):
+        """Commit changes at the end, unless they are part of a batch"""
+        if self._batching:
+            yield
+            return
+        trace.count("history_writes")
+        with trace.stage("history_write"), self.connection:
+            yield
+
+    @contextmanager
+    def batch(self):
+        """Make all changes in one transaction"""
+        if self._batching:
+            yield
+            return
+        self._batching = True
+        trace.count("history_writes")
+        try:
+            with self.connection:
+                yield
+        finally:
+            self._batching = False
+
+
+class History:
+    """History of paths, read once from its store
+
+    What was read, and views of it, are remembered until the store changes
+    Changes other than visits are counted as rewrites
+    It can be used from several threads, one at a time
+    """
+
+    def __init__(self, store_):
+        self.store = store_
+        self._key = None
+        self._changes = 0
+        self.rewrites = 0
+        self._memos: dict = {}
+        self._lock = threading.RLock()
+
+    def _memo(self, name, method):
+        with self._lock:
+            key = self.store.signature(), self._changes
+            if key != self._key:
+                self._memos.clear()
+                self._key = key
+            try:
+                return self._memos[name]
+            except KeyError:
+                self._memos[name] = method()
+                return self._memos[name]
+
+    def items(self) -> List[list]:
+        """All items, as read from the store"""
+        return self._memo("items", self._read)
+
+    def _read(self) -> List[list]:
+        with trace.stage("history_read"):
+            return self.store.read()
+
+    def sorted(self) -> List[list]:
+        """Items sorted by ascending frecency"""
+        return self._memo("sorted", lambda: list(reversed(self.frecent())))
+
+    def frecent(self) -> List[Entry]:
+        """Entries sorted by descending frecency"""
+        return self._memo("frecent", self._frecent)
+
+    def _frecent(self) -> List[Entry]:
+        with trace.stage("history_read"):
+            return [Entry(*_) for _ in self.store.frecent()]
+
+    def frecent_paths(self) -> IndexedPaths:
+        """Unique paths of the frecent entries, indexed for matching"""
+        return self._memo("frecent_paths", self._frecent_paths)
+
+    def _frecent_paths(self) -> IndexedPaths:
+        entries = iterutils.unique(self.frecent(), key=lambda _: _.path)
+        return IndexedPaths.split([_.path for _ in entries], [_.parts for _ in entries])
+
+    def named(self, name: str) -> Sequence[Union[Entry, list]]:
+        """Items whose path is that name, or whose basename is
+
+        Rows from an indexed store, else Entries, most frecent first
+        """
+        if self.store.indexed:
+            with self._lock:
+                return self.store.named(name)
+        return [_ for _ in self.frecent() if name in (_.path, _.basename)]
+
+    def _changed(self):
+        self._changes += 1
+
+    def visit(self, path: str) -> None:
+        """Count another visit to that path"""
+        with self._lock:
+            self.store.visit(path)
+            self._changed()
+
+    def forget(self, paths_: Iterable[str]) -> None:
+        """Remove those paths from history"""
+        with self._lock:
+            self.store.forget(paths_)
+            self.rewrites += 1
+            self._changed()
+
+    def write(self, items: Iterable) -> None:
+        with self._lock:
+            self.store.write(items)
+            self.rewrites += 1
+            self._changed()
+
+    @contextmanager
+    def batch(self):
+        try:
+            with self.store.batch():
+                yield
+        finally:
+            self._changed()
+
+
+_histories: dict = {}
+
+
+def store(path_to_csv, path_to_sqlite):
+    """The store for history, SQLite if that has been migrated to, else CSV"""
+    if os.path.isfile(path_to_sqlite):
+        return SqliteHistory(path_to_sqlite)
+    return CsvHistory(path_to_csv)
+
+
+def signature(path_to_csv, path_to_sqlite):
+    """The signature of the store for history, without opening it
+
+    It changes whenever history does
+    """
+    if os.path.isfile(path_to_sqlite):
+        return file_signature(path_to_sqlite)
+    return file_signature(path_to_csv), file_signature(f"{path_to_csv}.journal")
+
+
+def history(path_to_csv, path_to_sqlite) -> History:
+    """The History kept in either of those files
+
+    SQLite is used if history has been migrated to it, else CSV
+    """
+    key = str(path_to_sqlite) if os.path.isfile(path_to_sqlite) else str(path_to_csv)
+    try:
+        return _histories[key]
+    except KeyError:
+        _histories[key] = History(store(path_to_csv, path_to_sqlite))
+        return _histories[key]
+
+
+def migrate(path_to_csv, path_to_sqlite) -> int:
+    """Copy history from the CSV file to a new SQLite database
+
+    The CSV file is left as it was, but will no longer be used
+    Give the number of items copied
+    """
+    if os.path.isfile(path_to_sqlite):
+        return 0
+    items = CsvHistory(path_to_csv).rows()
+    path_to_new = f"{path_to_sqlite}.new"
+    if os.path.isfile(path_to_new):
+        os.remove(path_to_new)
+    sqlite = SqliteHistory(path_to_new)
+    sqlite.write(items)
+    sqlite.connection.close()
+    os.replace(path_to_new, path_to_sqlite)
+    return len(items)
@@ -0,0 +1,122 @@
+"""Index paths, to find matches without scanning every path
+
+Paths are indexed by their full path, by basename and by each component
+    Basenames and components are also sorted, for prefix lookup
+Each index is built only when a matcher first needs it
+"""
+
+import bisect
+import os
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+glob_characters = set("*?[")
+
+Positions = Dict[str, List[int]]
+
+
+class IndexedPaths(tuple):
+    """An ordered tuple of paths, with indexes built when first needed
+
+    Matches from the indexes are given in the same order as the paths
+    """
+
+    def __init__(self, _paths=()):
+        self._indexes: Dict[str, Positions] = {}
+        self._keys: Dict[str, List[str]] = {}
+        self._parts: Optional[List[Tuple[str, ...]]] = None
+
+    @classmethod
+    def of(cls, paths_) -> "IndexedPaths":
+        return paths_ if isinstance(paths_, cls) else cls(paths_)
+
+    @classmethod
+    def split(cls, paths_, parts: List[Tuple[str, ...]]) -> "IndexedPaths":
+        """Those paths, whose components have already been split into parts"""
+        indexed = cls(paths_)
+        indexed._parts = parts
+        return indexed
+
+    def parts(self) -> List[Tuple[str, ...]]:
+        """Components of each path"""
+        if self._parts is None:
+            self._parts = [tuple(str(_).split(os.path.sep)) for _ in self]
+        return self._parts
+
+    def positions(self, name: str) -> Positions:
+        """Positions of paths by their "path", "base" name, or each "part"
+
+        Each index is built when it is first needed
+        """
+        try:
+            return self._indexes[name]
+        except KeyError:
+            pass
+        positions: Positions = {}
+        if name == "path":
+            for i, path_ in enumerate(self):
+                positions.setdefault(str(path_), []).append(i)
+        elif name == "base":
+            for i, parts in enumerate(self.parts()):
+                positions.setdefault(parts[-1], []).append(i)
+        else:
+            for i, parts in enumerate(self.parts()):
+                for part in set(parts):
+                    positions.setdefault(part, []).append(i)
+        self._indexes[name] = positions
+        return positions
+
+    def keys(self, name: str) -> List[str]:
+        """Sorted keys of that index"""
+        try:
+            return self._keys[name]
+        except KeyError:
+            self._keys[name] = sorted(self.positions(name))
+            return self._keys[name]
+
+    def _at(self, positions: List[int]) -> list:
+        return [self[i] for i in sorted(set(positions))]
+
+    @staticmethod
+    def _prefixed(positions: Positions, keys: List[str], prefix: str) -> List[int]:
+        """Positions of all keys which start with that prefix"""
+        result: List[int] = []
+        for key in keys[bisect.bisect_left(keys, prefix) :]:
+            if not key.startswith(prefix):
+                break
+            result.extend(positions[key])
+        return result
+
+    def matching(self, matcher: str, dir_: str) -> Optional[list]:
+        """Paths which the named matcher would match for dir_
+
+        Or None if the indexes cannot tell, and paths must be scanned
+
+        >>> paths_ = IndexedPaths(['/usr/bin', '/usr/local/bin', '/usr/lib'])
+        >>> assert paths_.matching('same_base', 'bin') == list(paths_[:2])
+        >>> assert paths_.matching('glob_base', 'li') == ['/usr/lib']
+        >>> assert paths_.matching('ancestor', 'local') == ['/usr/local/bin']
+        >>> assert paths_.matching('within', 'sr/l') is None
+        """
+        if not dir_ or glob_characters & set(dir_):
+            return None
+        if matcher == "same":
+            return self._at(self.positions("path").get(dir_, []))
+        if matcher == "same_base":
+            return self._at(self.positions("base").get(dir_, []))
+        if matcher == "glob_base":
+            return self._at(
+                self._prefixed(self.positions("base"), self.keys("base"), dir_)
+            )
+        if matcher == "ancestor":
+            return self._at(self.positions("part").get(dir_, []))
+        if matcher == "glob_match":
+            return self._at(
+                self._prefixed(self.positions("part"), self.keys("part"), dir_)
+            )
+        if matcher == "glob_base_glob":
+            # "*basename" can only start with dir_ if dir_ has a glob
+            return []
+        return None
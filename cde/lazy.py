@@ -0,0 +1,35 @@
+"""Import modules when they are first used, not when cde starts
+
+Some imports take most of the time cde needs to start
+    e.g. pysyte.types.paths imports path, which imports setuptools
+But not every command needs them, e.g. --version does not
+"""
+
+import importlib.util
+import sys
+from types import ModuleType
+
+
+def module(name: str) -> ModuleType:
+    """That module, which is loaded when one of its attributes is used
+
+    >>> json = module('json')
+    >>> json.dumps([])
+    '[]'
+    """
+    try:
+        return sys.modules[name]
+    except KeyError:
+        pass
+    spec = importlib.util.find_spec(name)
+    if not spec or not spec.loader:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module_ = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module_
+    loader.exec_module(module_)
+    parent, _, child = name.rpartition(".")
+    if parent:
+        setattr(sys.modules[parent], child, module_)
+    return module_
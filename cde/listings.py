@@ -0,0 +1,229 @@
+"""Listings of directories, read at most once while looking for a directory
+
+Looking for a directory can try the same parents in several ways
+    (under here, in history, at home, ...)
+So directories are scanned once, and their entries (which cache stats) kept
+    Paths not yet seen in any listing are stat'ed once, and that kept too
+
+Listings are kept only within fresh(), i.e. for one lookup
+    outside of that every call goes to the filesystem
+
+A thread can be cancelled while it lists (see cancellable())
+    its next scan or stat then raises Cancelled instead
+"""
+
+import contextlib
+import os
+import threading
+from fnmatch import fnmatch
+from stat import S_ISDIR
+from stat import S_ISREG
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+
+from cde import trace
+
+Entries = Dict[str, os.DirEntry]
+
+
+class Cancelled(Exception):
+    """Nothing wants what this thread is looking for any more"""
+
+
+class Listings:
+    def __init__(self, caching: bool = True):
+        self.caching = caching
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[str, Optional[Entries]] = {}
+        self._stats: Dict[str, Optional[os.stat_result]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+
+    def _cached(self, cache: dict, key: str, read):
+        """The value for key in cache, reading it (once) if needed"""
+        if not self.caching:
+            self.misses += 1
+            return read(key)
+        with self._locks.setdefault(key, threading.Lock()):
+            try:
+                value = cache[key]
+                self.hits += 1
+            except KeyError:
+                value = cache[key] = read(key)
+                self.misses += 1
+        return value
+
+    def entries(self, path_to_dir) -> Optional[Entries]:
+        """Entries in that directory, by name, or None if it cannot be listed"""
+        key = os.path.abspath(str(path_to_dir))
+        return self._cached(self._entries, key, _scan)
+
+    def _entry(self, path_) -> Optional[os.DirEntry]:
+        """The entry for that path, if its parent has already been listed"""
+        if not self.caching:
+            return None
+        parent, name = os.path.split(os.path.abspath(str(path_)))
+        entries = self._entries.get(parent)
+        entry = entries.get(name) if entries else None
+        if entry:
+            self.hits += 1
+        return entry
+
+    def stat(self, path_) -> Optional[os.stat_result]:
+        """The stat of that path (following links), or None if it is not there"""
+        entry = self._entry(path_)
+        if entry:
+            try:
+                return entry.stat()
+            except OSError:
+                return None
+        key = os.path.abspath(str(path_))
+        return self._cached(self._stats, key, _stat)
+
+    def exists(self, path_) -> bool:
+        return bool(path_) and self.stat(path_) is not None
+
+    def isdir(self, path_) -> bool:
+        entry = self._entry(path_)
+        if entry:
+            return _is(entry.is_dir)
+        stat = self.stat(path_)
+        return stat is not None and S_ISDIR(stat.st_mode)
+
+    def isfile(self, path_) -> bool:
+        entry = self._entry(path_)
+        if entry:
+            return _is(entry.is_file)
+        stat = self.stat(path_)
+        return stat is not None and S_ISREG(stat.st_mode)
+
+    def names(self, path_to_dir, glob: str = "*", kind: str = "") -> List[str]:
+        """Names in that directory matching the glob
+
+        kind can be "dir" or "file" to only give names of those
+        """
+        entries = self.entries(path_to_dir) or {}
+        wanted = {"dir": os.DirEntry.is_dir, "file": os.DirEntry.is_file}.get(kind)
+        return [
+            name
+            for name, entry in entries.items()
+            if fnmatch(name, glob) and (not wanted or _is(lambda: wanted(entry)))
+        ]
+
+    def contains(self, path_to_dir, glob: str, kind: str = "") -> bool:
+        """Whether that directory has any names matching the glob"""
+        return bool(self.names(path_to_dir, glob, kind))
+
+    def listed(self) -> List[str]:
+        """Directories which were listed, or had paths in them stat'ed
+
+        >>> listings = Listings()
+        >>> assert listings.entries('/usr') and not listings.exists('/not/there')
+        >>> listings.listed()
+        ['/not', '/usr']
+        """
+        stated = {os.path.dirname(_) for _ in self._stats}
+        return sorted(set(self._entries) | stated)
+
+    def counts(self) -> Dict[str, int]:
+        """How many reads were saved, and how many made
+
+        >>> listings = Listings()
+        >>> assert listings.isdir('/') and listings.isdir('/')
+        >>> listings.counts()
+        {'hits': 1, 'misses': 1}
+        """
+        return {"hits": self.hits, "misses": self.misses}
+
+
+def _scan(path_to_dir: str) -> Optional[Entries]:
+    _check_cancelled()
+    trace.count("listdirs")
+    try:
+        with os.scandir(path_to_dir) as entries:
+            return {_.name: _ for _ in entries}
+    except OSError:
+        return None
+
+
+def _stat(path_: str) -> Optional[os.stat_result]:
+    _check_cancelled()
+    trace.count("stats")
+    try:
+        return os.stat(path_)
+    except OSError:
+        return None
+
+
+def _is(method) -> bool:
+    try:
+        return method()
+    except OSError:
+        return False
+
+
+_listings = Listings(caching=False)
+
+
+def current() -> Listings:
+    """The listings for the current lookup"""
+    return _listings
+
+
+@contextlib.contextmanager
+def fresh() -> Iterator[Listings]:
+    """Keep listings until the end of this lookup
+
+    >>> with fresh() as listings:
+    ...     assert current() is listings
+    >>> assert current() is not listings
+    """
+    global _listings
+    previous = _listings
+    _listings = Listings()
+    try:
+        yield _listings
+    finally:
+        _listings = previous
+
+
+_cancelling = threading.local()
+
+
+@contextlib.contextmanager
+def cancellable(event: Optional[threading.Event]) -> Iterator[None]:
+    """Stop listing in this thread once that event is set
+
+    >>> event = threading.Event()
+    >>> with cancellable(event):
+    ...     assert current().isdir('/')
+    ...     event.set()
+    ...     current().isdir('/')
+    Traceback (most recent call last):
+    ...
+    cde.listings.Cancelled
+    """
+    previous = cancelling()
+    _cancelling.event = event
+    try:
+        yield
+    finally:
+        _cancelling.event = previous
+
+
+def cancelling() -> Optional[threading.Event]:
+    """The event which would cancel listing in this thread, if any"""
+    return getattr(_cancelling, "event", None)
+
+
+def cancelled() -> bool:
+    """Whether listing in this thread has been cancelled"""
+    event = cancelling()
+    return event is not None and event.is_set()
+
+
+def _check_cancelled() -> None:
+    if cancelled():
+        raise Cancelled()
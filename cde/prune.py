@@ -0,0 +1,57 @@
+"""Directories which no walk looks into
+
+Some directories are rarely where anyone wants to go, but hold many others
+    e.g. .git, node_modules, __pycache__, build and *.egg-info
+The prune setting lists globs of their names (see cde.config)
+    and walks do not list directories with those names
+    unless they are asked for by name
+
+The globs are compiled once, into one regular expression
+    and the same matcher is given for the same globs
+"""
+
+import os
+import re
+from fnmatch import translate
+from functools import lru_cache
+from typing import Callable
+
+from cde import config
+
+
+@lru_cache(maxsize=4)
+def compiled(globs: str) -> re.Pattern:
+    """One pattern for names matching any of those ":"-separated globs
+
+    >>> pattern = compiled('.git:*.egg-info')
+    >>> assert pattern.match('.git') and pattern.match('cde.egg-info')
+    >>> assert not pattern.match('.github')
+    >>> assert not compiled('').match('.git')
+    """
+    patterns = [translate(_) for _ in globs.split(os.pathsep) if _]
+    return re.compile("|".join(patterns) or "(?!)")
+
+
+def matcher() -> Callable[[str], bool]:
+    """Whether a name is pruned, by the prune setting
+
+    Get this once for a walk, rather than once per name
+
+    >>> assert matcher() is matcher()
+    """
+    return _matcher(config.setting("prune"))
+
+
+@lru_cache(maxsize=4)
+def _matcher(globs: str) -> Callable[[str], bool]:
+    pattern = compiled(globs)
+    return lambda name: pattern.match(name) is not None
+
+
+def pruned(name: str) -> bool:
+    """Whether a directory of that name is pruned
+
+    >>> assert pruned('node_modules')
+    >>> assert not pruned('node')
+    """
+    return matcher()(name)
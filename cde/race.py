@@ -0,0 +1,73 @@
+"""Try ways of finding a directory all at once, keeping their order of precedence
+
+Finding a directory tries several strategies (under here, history, $PATH, home)
+    and uses the answer of the first which finds anything
+Tried one after another, a slow strategy (e.g. on a slow mount) delays all after it
+    even when a later one would have been used anyway
+
+Raced, each strategy runs in its own thread, and answers are taken in order
+    so an answer is used as soon as every strategy before it has found nothing
+Then the others are cancelled: they stop at their next listing (see cde.listings)
+
+Threads are daemons, so a cancelled strategy never holds up the end of cde
+"""
+
+import threading
+from typing import Callable
+from typing import List
+
+from cde import listings
+
+Strategy = Callable[[], object]
+
+
+def in_turn(strategies: List[Strategy]):
+    """The first answer which is not empty, trying strategies one after another
+
+    Any error is raised before later strategies are tried
+
+    >>> in_turn([lambda: None, lambda: '/usr', lambda: 1 / 0])
+    '/usr'
+    """
+    for strategy in strategies:
+        found = strategy()
+        if found:
+            return found
+    return None
+
+
+def raced(strategies: List[Strategy]):
+    """The first answer which is not empty, trying strategies all at once
+
+    Answers (and errors) are taken in the order of the strategies
+        so this gives what in_turn() would have given, but sooner
+
+    >>> import time
+    >>> raced([lambda: time.sleep(0.01), lambda: '/usr', lambda: 1 / 0])
+    '/usr'
+    """
+    from concurrent.futures import Future
+
+    cancelled = threading.Event()
+
+    def run(strategy: Strategy, future: Future) -> None:
+        with listings.cancellable(cancelled):
+            try:
+                future.set_result(strategy())
+            except BaseException as e:
+                future.set_exception(e)
+
+    futures: List[Future] = []
+    for strategy in strategies:
+        future: Future = Future()
+        thread = threading.Thread(target=run, args=(strategy, future), daemon=True)
+        thread.start()
+        futures.append(future)
+    try:
+        for future in futures:
+            found = future.result()
+            if found:
+                return found
+        return None
+    finally:
+        cancelled.set()
@@ -0,0 +1,166 @@
+"""Remember what lookups found, so that repeating one need not look again
+
+Lookups are remembered by their args, the cwd and $PATH
+    with what they found: a path, or an error (none found, or too many)
+The most recent cache_size lookups are kept (see cde.config)
+    with a size of 0 none are
+
+A remembered lookup is used only if
+    history has not changed since, except by visits that cannot change it
+    the cwd has not changed since (by its mtime)
+    and, if it found a path, that path is still a directory
+    or, if it found none, no directory it listed has changed (by their mtimes)
+        lookups which listed more than max_listed directories are not remembered
+A visit to a path can change lookups of any name within that path
+    so those are forgotten, and other lookups are kept
+Any other change to history forgets all lookups
+"""
+
+import json
+import os
+import tempfile
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+
+glob_characters = set("*?[")
+max_listed = 1000
+
+
+def cwd_mtime() -> Optional[int]:
+    return mtime(".")
+
+
+def mtime(path_: str) -> Optional[int]:
+    try:
+        return os.stat(path_).st_mtime_ns
+    except OSError:
+        return None
+
+
+def mtimes(paths_: Iterable[str]) -> Dict[str, Optional[int]]:
+    """The mtime of each of those paths, or None for those which are not there
+
+    >>> mtimes(['/', '/not/there'])
+    {'/': ..., '/not/there': None}
+    """
+    return {_: mtime(_) for _ in paths_}
+
+
+def is_changed_by(dir_: str, path: str) -> bool:
+    """Whether a visit to that path could change what a lookup of dir_ finds
+
+    >>> assert is_changed_by('lo', '/usr/local')
+    >>> assert not is_changed_by('lib', '/usr/local')
+    >>> assert is_changed_by('2', '/usr/local')
+    """
+    if dir_.isdigit() or glob_characters & set(dir_):
+        # Numbers choose by frecent order, globs could match anything
+        return True
+    return dir_ in path
+
+
+class Resolved:
+    """Lookups remembered in a JSON file, for history of one signature"""
+
+    def __init__(self, path_to_file: str, signature, size: int):
+        self.path = str(path_to_file)
+        self.signature = repr(signature)
+        self.size = size
+        self.lookups: Dict[str, dict] = self._read() if size else {}
+
+    def _read(self) -> Dict[str, dict]:
+        try:
+            with open(self.path) as stream:
+                data = json.load(stream)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get("signature") != self.signature:
+            return {}
+        return data.get("lookups", {})
+
+    @staticmethod
+    def key(dir_: str, sub_dirs: List[str]) -> str:
+        return json.dumps([dir_, sub_dirs, os.getcwd(), os.environ.get("PATH", "")])
+
+    def get(self, key: str) -> Optional[dict]:
+        """What that lookup found, if it is still true"""
+        lookup = self.lookups.get(key)
+        if not lookup or lookup["cwd_mtime"] != cwd_mtime():
+            return None
+        if lookup["found"] and not os.path.isdir(lookup["found"]):
+            return None
+        listed = lookup.get("listed", {})
+        if any(mtime(path_) != mtime_ for path_, mtime_ in listed.items()):
+            return None
+        # Most recently used last
+        self.lookups[key] = self.lookups.pop(key)
+        return lookup
+
+    def remember(
+        self,
+        key: str,
+        found: str = "",
+        error: Optional[Exception] = None,
+        listed: Optional[Dict[str, Optional[int]]] = None,
+    ) -> None:
+        """That lookup found a path, or raised that error
+
+        A lookup which found none is given the mtimes of the directories it listed
+        """
+        self.lookups.pop(key, None)
+        listed = listed if error and listed else {}
+        if len(listed) > max_listed:
+            # Too many to check on each get()
+            return
+        self.lookups[key] = {
+            "dir": json.loads(key)[0],
+            "cwd_mtime": cwd_mtime(),
+            "found": found,
+            "error": type(error).__name__ if error else "",
+            "message": str(error) if error else "",
+            "possibles": [str(_) for _ in getattr(error, "possibles", [])],
+            "listed": listed,
+        }
+        while len(self.lookups) > self.size:
+            del self.lookups[next(iter(self.lookups))]
+
+    def visited(self, path: str, by: str = "") -> None:
+        """Forget lookups which could find something else, now path was visited
+
+        A lookup is not changed by visiting what it found, so that one is kept
+        """
+        self.lookups = {
+            key: lookup
+            for key, lookup in self.lookups.items()
+            if key == by or not is_changed_by(lookup["dir"], path)
+        }
+
+    def forget(self) -> None:
+        self.lookups.clear()
+
+    def write(self, signature) -> None:
+        """Keep the lookups, for history with that signature
+
+        Lookups which cannot be kept are not worth failing for
+        """
+        if not self.size:
+            return
+        signature_ = repr(signature)
+        data = {"signature": signature_, "lookups": self.lookups}
+        path_to_dir = os.path.dirname(os.path.abspath(self.path))
+        try:
+            handle, path_to_temp = tempfile.mkstemp(
+                dir=path_to_dir, prefix=".resolved."
+            )
+        except OSError:
+            return
+        try:
+            with os.fdopen(handle, "w") as stream:
+                json.dump(data, stream)
+            os.replace(path_to_temp, self.path)
+        except BaseException:
+            os.remove(path_to_temp)
+            raise
+        self.signature = signature_
@@ -0,0 +1,232 @@
+"""Answer cde requests from a long-lived process
+
+The shell pays for Python's startup (and imports) on every cde
+    A server pays that once, then answers over a Unix socket
+    which only its user can connect to
+
+A request is NUL-separated fields: the caller's cwd, a command, and its args
+    between the cwd and command can be "NAME=value" fields
+        giving the caller's $PATH and CDE_* variables, used for that request only
+    The connection is closed for writing when the request is finished
+A response is lines, each prefixed by where it should go:
+    "1 " for stdout, "2 " for stderr
+    and a final "? " line with the exit status
+
+Between requests the server purges lost paths from history
+    every purge_interval seconds (see cde.config)
+Or, with the watch setting, it keeps history and the index of directories current
+    as directories change (see cde.watch)
+"""
+
+import contextlib
+import io
+import os
+import socketserver
+import threading
+from types import SimpleNamespace
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from cde import cde
+from cde import config
+from cde import timings
+
+
+def resolve(args: List[str]) -> int:
+    """Find a directory for args, as the command line would"""
+    dir_, *sub_dirs = args if args else ["."]
+    try:
+        return 0 if cde.cde(dir_, sub_dirs) else 1
+    except cde.TryAgain as e:
+        cde.stderr(f"Try again: {e}")
+    except cde.ToDo as e:
+        cde.stderr(f"Error: {e}")
+    return 1
+
+
+def add(args: List[str]) -> int:
+    """Add the paths in args to history"""
+    for arg in args:
+        cde.add_path(os.path.realpath(arg))
+    return 0
+
+
+def delete(args: List[str]) -> int:
+    """Remove the historical path matching args from history"""
+    dir_, *sub_dirs = args
+    cde.delete_path_to_historical_dir(dir_, sub_dirs)
+    return 0
+
+
+def complete(args: List[str]) -> int:
+    """Show paths in history which complete the last of args"""
+    cde.complete(SimpleNamespace(dirnames=args))
+    return 0
+
+
+commands = {
+    "resolve": resolve,
+    "add": add,
+    "delete": delete,
+    "complete": complete,
+}
+
+
+def is_passed(name: str) -> bool:
+    """Whether a caller's variable of that name is used for its request
+
+    >>> assert is_passed('PATH') and is_passed('CDE_RACE')
+    >>> assert not is_passed('LD_PRELOAD')
+    """
+    return name == "PATH" or name.startswith("CDE_")
+
+
+@contextlib.contextmanager
+def environment(variables: Optional[Dict[str, str]]) -> Iterator[None]:
+    """Use the caller's variables until the end of this block
+
+    The caller's CDE_* variables are used instead of the server's
+        and its $PATH, if it gave one
+    """
+    if variables is None:
+        yield
+        return
+    previous = dict(os.environ)
+    for name in [_ for _ in os.environ if _.startswith("CDE_")]:
+        del os.environ[name]
+    os.environ.update({k: v for k, v in variables.items() if is_passed(k)})
+    try:
+        yield
+    finally:
+        os.environ.clear()
+        os.environ.update(previous)
+
+
+def respond(
+    cwd: str,
+    command: str,
+    args: List[str],
+    variables: Optional[Dict[str, str]] = None,
+) -> Tuple[int, str, str]:
+    """Run the command from cwd, giving its status, stdout and stderr
+
+    With the caller's variables, if given
+    """
+    out, err = io.StringIO(), io.StringIO()
+    with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+        try:
+            os.chdir(cwd)
+            with environment(variables):
+                status = commands[command](args)
+        except KeyError:
+            cde.stderr(f"Error: unknown command {command!r}")
+            status = 2
+        except SystemExit as e:
+            status = e.code if isinstance(e.code, int) else int(bool(e.code))
+        except (OSError, cde.ToDo, ValueError) as e:
+            cde.stderr(f"Error: {e}")
+            status = 1
+    return status, out.getvalue(), err.getvalue()
+
+
+def as_response(status: int, out: str, err: str) -> str:
+    """Prefix each line of output with its stream
+
+    >>> as_response(0, 'here\\n', '')
+    '1 here\\n? 0\\n'
+    """
+    lines = [f"1 {_}" for _ in out.splitlines()]
+    lines.extend(f"2 {_}" for _ in err.splitlines())
+    lines.append(f"? {status}")
+    return "".join(f"{_}\n" for _ in lines)
+
+
+def parsed(request: str) -> Optional[Tuple[str, str, List[str], Dict[str, str]]]:
+    """The cwd, command, args and variables of a request, or None if it has none
+
+    >>> parsed('/usr\\0PATH=/bin\\0resolve\\0local\\0')
+    ('/usr', 'resolve', ['local'], {'PATH': '/bin'})
+    >>> parsed('/usr\\0')
+    """
+    cwd, *fields = request.rstrip("\0").split("\0")
+    variables = {}
+    while fields and "=" in fields[0]:
+        name, value = fields.pop(0).split("=", 1)
+        variables[name] = value
+    if not fields:
+        return None
+    command, *args = fields
+    return cwd, command, args, variables
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        request = parsed(self.rfile.read().decode())
+        if not request:
+            response = as_response(2, "", "Error: no command given")
+        else:
+            cwd, command, args, variables = request
+            response = as_response(*respond(cwd, command, args, variables))
+        self.wfile.write(response.encode())
+
+
+class Server(socketserver.UnixStreamServer):
+    def __init__(self, path_to_socket: str):
+        super().__init__(path_to_socket, RequestHandler)
+        self.purge_interval = config.number("purge_interval")
+        self.purged = 0.0
+        self.watcher = cde.watcher() if config.number("watch") else None
+        self.watching = threading.Event()
+        if self.watcher:
+            # Refreshing the index can take a while, so requests need not wait
+            threading.Thread(target=self._start_watching, daemon=True).start()
+
+    def server_bind(self):
+        # Make the socket with no permissions for others, rather than chmod it later
+        umask = os.umask(0o177)
+        try:
+            super().server_bind()
+        finally:
+            os.umask(umask)
+
+    def _start_watching(self):
+        self.watcher.start()
+        self.watching.set()
+
+    def server_close(self):
+        super().server_close()
+        if self.watcher:
+            self.watcher.close()
+
+    def service_actions(self):
+        """Apply changes to directories, or purge history, if it is time to"""
+        if self.watcher:
+            if self.watching.is_set():
+                self.watcher.update()
+            return
+        if not self.purge_interval:
+            return
+        now = timings.now()
+        if now - self.purged < self.purge_interval:
+            return
+        self.purged = now
+        cde.purge()
+
+
+def serve(path_to_socket: str) -> None:
+    """Answer requests on that socket until interrupted
+
+    Requests are answered one at a time, so history is not written concurrently
+    """
+    path_to_socket = str(path_to_socket)
+    with contextlib.suppress(FileNotFoundError):
+        os.unlink(path_to_socket)
+    try:
+        with Server(path_to_socket) as server:
+            server.serve_forever()
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(path_to_socket)
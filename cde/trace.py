@@ -0,0 +1,169 @@
+"""Trace where the time goes while cde looks for a directory
+
+Tracing is on if the trace setting is a path to a log file (see cde.config)
+    or "-" for stderr, as is set by "cde --profile"
+Each lookup then adds a JSON line with
+    how long each stage took, in seconds
+    and counts of listings, stats, history reads and writes, and matchers
+
+Stages include any stages they call
+    and times in parallel threads are added together
+"""
+
+import contextlib
+import functools
+import json
+import os
+import sys
+import time
+from collections import Counter
+from collections import defaultdict
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+
+from cde import config
+
+
+class Trace:
+    def __init__(self, args: Iterable[str]):
+        self.args = list(args)
+        self.stages: Dict[str, float] = defaultdict(float)
+        self.counts: Counter = Counter()
+        self.found = ""
+        self.error = ""
+        self.started = time.perf_counter()
+
+    def as_dict(self) -> dict:
+        return {
+            "time": time.time(),
+            "args": self.args,
+            "found": self.found,
+            "error": self.error,
+            "total": time.perf_counter() - self.started,
+            "stages": dict(self.stages),
+            "counts": dict(self.counts),
+        }
+
+
+_trace: Optional[Trace] = None
+_profiling = False
+
+
+def profile() -> None:
+    """Trace lookups to stderr, whatever the trace setting"""
+    global _profiling
+    _profiling = True
+
+
+def destination() -> str:
+    """Where traces are written: "-" for stderr, a path, or "" for nowhere"""
+    return "-" if _profiling else config.setting("trace")
+
+
+def count(name: str, n: int = 1) -> None:
+    if _trace:
+        _trace.counts[name] += n
+
+
+@contextlib.contextmanager
+def stage(name: str):
+    """Add the time taken in this block to that stage"""
+    if not _trace:
+        yield
+        return
+    trace_, start = _trace, time.perf_counter()
+    try:
+        yield
+    finally:
+        trace_.stages[name] += time.perf_counter() - start
+
+
+def staged(method):
+    """Time calls to the method as a stage, named for the method"""
+
+    @functools.wraps(method)
+    def stage_method(*args, **kwargs):
+        if not _trace:
+            return method(*args, **kwargs)
+        with stage(method.__name__):
+            return method(*args, **kwargs)
+
+    return stage_method
+
+
+@contextlib.contextmanager
+def resolving(args: Iterable[str]):
+    """Trace one lookup, if tracing is on, writing the trace at the end"""
+    global _trace
+    where = destination()
+    if not where or _trace:
+        yield None
+        return
+    _trace = trace_ = Trace(args)
+    try:
+        yield trace_
+    except Exception as e:
+        trace_.error = type(e).__name__
+        raise
+    finally:
+        _trace = None
+        write(json.dumps(trace_.as_dict()), where)
+
+
+def write(line: str, where: str) -> None:
+    if where == "-":
+        sys.stderr.write(f"{line}\n")
+        return
+    with open(os.path.expanduser(where), "a") as stream:
+        stream.write(f"{line}\n")
+
+
+def read(path_to_log: str) -> List[dict]:
+    """Traces from that log, skipping any lines which are not traces"""
+    traces = []
+    with open(os.path.expanduser(path_to_log)) as stream:
+        for line in stream:
+            try:
+                traces.append(json.loads(line))
+            except ValueError:
+                continue
+    return traces
+
+
+def summary(traces: List[dict]) -> List[str]:
+    """Lines describing stages, slowest first, then average counts
+
+    >>> traces = [
+    ...     {'total': 0.02, 'stages': {'find_in_history': 0.01}, 'counts': {}},
+    ...     {'total': 0.04, 'stages': {'find_at_home': 0.03}, 'counts': {}},
+    ... ]
+    >>> for line in summary(traces)[2:4]:
+    ...     print(line.split()[0])
+    total
+    find_at_home
+    """
+    import statistics
+
+    seconds: Dict[str, List[float]] = defaultdict(list)
+    counts: Counter = Counter()
+    for trace_ in traces:
+        seconds["total"].append(trace_.get("total", 0.0))
+        for name, took in trace_.get("stages", {}).items():
+            seconds[name].append(took)
+        counts.update(trace_.get("counts", {}))
+    ms = lambda x: f"{x * 1000:9.2f}"
+    header = f"{'stage':32} {'lookups':>7} {'mean ms':>9} {'p95 ms':>9} {'max ms':>9}"
+    lines = [f"{len(traces)} lookups", header]
+    for name, took in sorted(seconds.items(), key=lambda x: -max(x[1])):
+        p95 = (
+            statistics.quantiles(took, n=20, method="inclusive")[18]
+            if len(took) > 1
+            else took[0]
+        )
+        mean = statistics.mean(took)
+        lines.append(f"{name:32} {len(took):7} {ms(mean)} {ms(p95)} {ms(max(took))}")
+    for name, total in sorted(counts.items()):
+        lines.append(f"{name:32} {total / max(len(traces), 1):9.1f} per lookup")
+    return lines
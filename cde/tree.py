@@ -0,0 +1,224 @@
+"""An index of directories, so that looking under them need not list them
+
+The index is kept in an SQLite database
+    one row per directory, with its mtime and the names of its sub-directories
+
+It is refreshed by walking down from some roots
+    Directories whose mtime has not changed are not listed again
+"""
+
+import os
+import stat
+import threading
+from typing import TYPE_CHECKING
+from typing import Callable
+from typing import Iterable
+from typing import List
+from typing import Optional
+
+from cde import lazy
+
+if TYPE_CHECKING:
+    import sqlite3
+else:
+    sqlite3 = lazy.module("sqlite3")
+
+separator = "\0"
+
+
+class DirectoryTree:
+    schema = """
+        CREATE TABLE IF NOT EXISTS directories (
+            path TEXT PRIMARY KEY,
+            mtime INTEGER NOT NULL,
+            names TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, path_to_file):
+        self.path = str(path_to_file)
+        # Lookups read the index from several threads, taking turns
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.executescript(self.schema)
+        self._lock = threading.Lock()
+
+    def _row(self, path_to_dir: str):
+        with self._lock:
+            return self.connection.execute(
+                "SELECT mtime, names FROM directories WHERE path = ?", (path_to_dir,)
+            ).fetchone()
+
+    def sub_directories(self, path_to_dir: str) -> Optional[List[str]]:
+        """Names of sub-directories of that directory
+
+        Or None if it is not in the index, or has changed since it was indexed
+        """
+        path_ = os.path.abspath(str(path_to_dir))
+        row = self._row(path_)
+        if not row:
+            return None
+        mtime, names = row
+        try:
+            if os.stat(path_).st_mtime_ns != mtime:
+                return None
+        except OSError:
+            return None
+        return names.split(separator) if names else []
+
+    def refresh(
+        self,
+        roots: Iterable[str],
+        depth: int,
+        descend: Callable[[str], bool] = lambda name: True,
+    ) -> int:
+        """Index directories under the roots, down to that depth
+
+        Sub-directories are not descended into if they are links
+            or if descend(name) is False
+
+        Give the number of directories which were listed
+        """
+        listed = 0
+        seen = set()
+        stack = [(os.path.abspath(os.path.expanduser(_)), 0) for _ in roots]
+        with self.connection:
+            while stack:
+                path_, level = stack.pop()
+                try:
+                    mtime = os.stat(path_).st_mtime_ns
+                except OSError:
+                    continue
+                seen.add(path_)
+                row = self._row(path_)
+                if row and row[0] == mtime:
+                    names = row[1].split(separator) if row[1] else []
+                else:
+                    names = list_sub_directories(path_)
+                    listed += 1
+                    self.connection.execute(
+                        "INSERT OR REPLACE INTO directories VALUES (?, ?, ?)",
+                        (path_, mtime, separator.join(names)),
+                    )
+                if level >= depth:
+                    continue
+                for name in names:
+                    if not descend(name):
+                        continue
+                    child = os.path.join(path_, name)
+                    if _is_link(child):
+                        continue
+                    stack.append((child, level + 1))
+            self._forget_unseen(roots, seen)
+        return listed
+
+    def update(
+        self,
+        path_to_dir: str,
+        depth: int,
+        descend: Callable[[str], bool] = lambda name: True,
+    ) -> List[str]:
+        """Index that directory again, after it has changed
+
+        New sub-directories are indexed down to that depth below it
+            and those which are gone are forgotten, with all under them
+        If the directory itself is gone it is forgotten
+
+        Give the paths of directories newly indexed
+        """
+        path_ = os.path.abspath(str(path_to_dir))
+        row = self._row(path_)
+        try:
+            mtime = os.stat(path_).st_mtime_ns
+        except OSError:
+            with self.connection:
+                self._forget_unseen([path_], set())
+            return []
+        old_names = set(row[1].split(separator)) if row and row[1] else set()
+        names = list_sub_directories(path_)
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO directories VALUES (?, ?, ?)",
+                (path_, mtime, separator.join(names)),
+            )
+            gone = [os.path.join(path_, _) for _ in old_names - set(names)]
+            self._forget_unseen(gone, set())
+        new = [os.path.join(path_, _) for _ in names if _ not in old_names]
+        if depth < 1:
+            return []
+        new = [_ for _ in new if descend(os.path.basename(_)) and not _is_link(_)]
+        if new:
+            self.refresh(new, depth - 1, descend)
+        return [_ for root in new for _ in self.directories(root)]
+
+    def directories(self, root: str) -> List[str]:
+        """Paths of indexed directories at, or under, root"""
+        root_ = os.path.abspath(os.path.expanduser(root))
+        under = f"{root_.rstrip(os.path.sep)}{os.path.sep}"
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT path FROM directories WHERE path = ? OR path LIKE ? ESCAPE '!'",
+                (root_, like_prefix(under)),
+            )
+            return [p for (p,) in rows.fetchall()]
+
+    def _forget_unseen(self, roots: Iterable[str], seen: set) -> None:
+        """Remove directories under roots which were not seen in a refresh"""
+        for root in roots:
+            root_ = os.path.abspath(os.path.expanduser(root))
+            under = f"{root_.rstrip(os.path.sep)}{os.path.sep}"
+            rows = self.connection.execute(
+                "SELECT path FROM directories WHERE path = ? OR path LIKE ? ESCAPE '!'",
+                (root_, like_prefix(under)),
+            )
+            unseen = [(p,) for (p,) in rows.fetchall() if p not in seen]
+            self.connection.executemany(
+                "DELETE FROM directories WHERE path = ?", unseen
+            )
+
+
+def like_prefix(string: str) -> str:
+    """A LIKE pattern for strings starting with that string
+
+    >>> like_prefix('/home/me_too/')
+    '/home/me!_too/%'
+    """
+    escaped = string.replace("!", "!!").replace("%", "!%").replace("_", "!_")
+    return f"{escaped}%"
+
+
+def list_sub_directories(path_to_dir: str) -> List[str]:
+    """Names of sub-directories (including links to them) in that directory"""
+    try:
+        with os.scandir(path_to_dir) as entries:
+            return sorted(_.name for _ in entries if _is_dir(_))
+    except OSError:
+        return []
+
+
+def _is_link(path_: str) -> bool:
+    try:
+        return stat.S_ISLNK(os.lstat(path_).st_mode)
+    except OSError:
+        return True
+
+
+def _is_dir(entry: os.DirEntry) -> bool:
+    try:
+        return entry.is_dir()
+    except OSError:
+        return False
+
+
+_trees: dict = {}
+
+
+def tree(path_to_file) -> Optional[DirectoryTree]:
+    """The index of directories in that file, if it has been made"""
+    key = str(path_to_file)
+    if not os.path.isfile(key):
+        return None
+    try:
+        return _trees[key]
+    except KeyError:
+        _trees[key] = DirectoryTree(key)
+        return _trees[key]
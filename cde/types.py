@@ -1,12 +1,22 @@
 """Types to make coding cde easier"""
-import os
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
 from typing import List
 
 
-from pysyte.types import paths
 from pysyte.types.lists import Uniques
 from pysyte.types.lists import UniquelyTrues
 
+from cde import lazy
+from cde import listings
+
+if TYPE_CHECKING:
+    from pysyte.types import paths
+else:
+    paths = lazy.module("pysyte.types.paths")
+
 
 class PossiblePaths(UniquelyTrues):
     """A unique list of possible paths"""
@@ -16,7 +26,7 @@ class PossiblePaths(UniquelyTrues):
 
     def predicate(self, item: str) -> bool:
         """Exclude items which don't exist"""
-        return bool(item) and os.path.exists(item)
+        return listings.current().exists(item)
 
     def paths(self) -> List[paths.StringPath]:
         return [_ for _ in self if self.predicate(_)]
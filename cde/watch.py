@@ -0,0 +1,325 @@
+"""Keep the index of directories, and history, current as directories change
+
+Refreshing the index walks all its roots, and purging history stats every path
+    both are slow for large trees, and stale between runs
+A watcher is told of changes as they happen, and updates only what changed
+    changed directories are indexed again, as are any new ones under them
+    paths in history under directories which are gone are forgotten
+Other paths in history are checked a few at a time, in turn
+    so lost paths are found without a blocking scan
+
+Changes come from inotify (on Linux, called through ctypes)
+    or, where that cannot be used, from polling the mtimes of directories
+    a slice of them at a time, so that polling never becomes a blocking scan
+"""
+
+import os
+import select
+import struct
+import sys
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+Changes = Tuple[Set[str], Set[str]]
+
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ONLYDIR = 0x1000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+watched_events = (
+    IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF
+)
+event_header = struct.Struct("iIII")
+
+
+def _libc():
+    """The C library, if it has inotify, else None"""
+    import ctypes
+    import ctypes.util
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    except OSError:
+        return None
+    if not hasattr(libc, "inotify_init1"):
+        return None
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    return libc
+
+
+def _os_error(libc) -> OSError:
+    import ctypes
+
+    errno = ctypes.get_errno()
+    return OSError(errno, os.strerror(errno))
+
+
+class Inotify:
+    """Changes to directories, as told by inotify"""
+
+    def __init__(self, libc):
+        self.libc = libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise _os_error(libc)
+        self.paths: Dict[int, str] = {}
+        self.overflowed = False
+
+    def watch(self, path_to_dir: str) -> None:
+        """Be told of changes to entries in that directory
+
+        Raises OSError if it cannot be watched, e.g. there are too many watches
+        """
+        path_ = os.fsencode(path_to_dir)
+        wd = self.libc.inotify_add_watch(self.fd, path_, watched_events | IN_ONLYDIR)
+        if wd < 0:
+            raise _os_error(self.libc)
+        self.paths[wd] = path_to_dir
+
+    def changes(self, timeout: float = 0.0) -> Changes:
+        """Directories which changed, and those which are gone
+
+        Wait up to timeout seconds for the first change
+        """
+        changed: Set[str] = set()
+        gone: Set[str] = set()
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        while ready:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _cookie, length = event_header.unpack_from(data, offset)
+                offset += event_header.size
+                name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+                offset += length
+                self._read(wd, mask, name, changed, gone)
+        return changed - gone, gone
+
+    def _read(self, wd: int, mask: int, name: str, changed: set, gone: set):
+        if mask & IN_Q_OVERFLOW:
+            # Events were lost, so anything may have changed
+            self.overflowed = True
+            changed.update(self.paths.values())
+            return
+        path_ = self.paths.get(wd)
+        if not path_:
+            return
+        if mask & IN_IGNORED:
+            del self.paths[wd]
+        elif mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+            gone.add(path_)
+            if mask & IN_MOVE_SELF:
+                # Its watch would follow it to wherever it was moved
+                self.libc.inotify_rm_watch(self.fd, wd)
+        else:
+            changed.add(path_)
+            if mask & IN_ISDIR and mask & (IN_DELETE | IN_MOVED_FROM):
+                gone.add(os.path.join(path_, name))
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class Poller:
+    """Changes to directories, found by polling their mtimes
+
+    Each call polls at most size directories, the next ones in turn
+        so no call stats every directory, however many are polled
+    """
+
+    def __init__(self, size: int = 1000):
+        self.size = size
+        self.mtimes: Dict[str, int] = {}
+        self._unpolled: List[str] = []
+
+    def watch(self, path_to_dir: str) -> None:
+        try:
+            self.mtimes[path_to_dir] = os.stat(path_to_dir).st_mtime_ns
+        except OSError:
+            pass
+
+    def changes(self, timeout: float = 0.0) -> Changes:
+        """The next directories whose mtimes changed, and those which are gone
+
+        This never waits for the timeout
+
+        >>> poller = Poller(size=1)
+        >>> poller.watch('/usr')
+        >>> poller.watch('/not/there')
+        >>> poller.mtimes['/usr'] = 0
+        >>> poller.changes()
+        ({'/usr'}, set())
+        >>> poller.changes()
+        (set(), set())
+        """
+        changed: Set[str] = set()
+        gone: Set[str] = set()
+        if not self._unpolled:
+            self._unpolled = list(self.mtimes)
+        polling = self._unpolled[-self.size :]
+        del self._unpolled[-self.size :]
+        for path_ in polling:
+            mtime = self.mtimes.get(path_)
+            if mtime is None:
+                continue
+            try:
+                now = os.stat(path_).st_mtime_ns
+            except OSError:
+                gone.add(path_)
+                del self.mtimes[path_]
+                continue
+            if now != mtime:
+                changed.add(path_)
+                self.mtimes[path_] = now
+        return changed, gone
+
+    def close(self) -> None:
+        self.mtimes.clear()
+        self._unpolled.clear()
+
+
+def notifier():
+    """An Inotify, if that can be used here, else a Poller"""
+    libc = _libc()
+    if libc:
+        try:
+            return Inotify(libc)
+        except OSError:
+            pass
+    return Poller()
+
+
+class Watcher:
+    """Keep an index of directories under some roots, and history, current
+
+    history_paths gives the paths in history, and forget removes some
+    """
+
+    def __init__(
+        self,
+        tree_,
+        roots: Iterable[str],
+        depth: int,
+        descend: Callable[[str], bool],
+        history_paths: Callable[[], List[str]],
+        forget: Callable[[List[str]], None],
+        notifier_=None,
+        checks: int = 100,
+    ):
+        self.tree = tree_
+        self.roots = [os.path.abspath(os.path.expanduser(_)) for _ in roots]
+        self.depth = depth
+        self.descend = descend
+        self.history_paths = history_paths
+        self.forget = forget
+        self.notifier = notifier_ or notifier()
+        self.poller = Poller()
+        self.checks = checks
+        self._unchecked: List[str] = []
+
+    def start(self) -> None:
+        """Index the roots, and watch every directory indexed under them"""
+        if self.tree and self.roots:
+            self.tree.refresh(self.roots, self.depth, self.descend)
+            for root in self.roots:
+                self._watch(self.tree.directories(root))
+
+    def _watch(self, paths_: Iterable[str]) -> None:
+        """Watch those directories, polling any which cannot be watched"""
+        for path_ in paths_:
+            try:
+                self.notifier.watch(path_)
+            except OSError as e:
+                if not self.poller.mtimes:
+                    sys.stderr.write(
+                        f"cde: cannot watch {path_} ({e.strerror}),"
+                        " so it and any others will be polled\n"
+                    )
+                self.poller.watch(path_)
+
+    def depth_below(self, path_to_dir: str) -> Optional[int]:
+        """How many levels may be indexed below that directory, if under a root
+
+        >>> watcher = Watcher(None, ['/usr'], 3, bool, list, print, Poller())
+        >>> watcher.depth_below('/usr/local')
+        2
+        >>> watcher.depth_below('/var')
+        """
+        for root in self.roots:
+            if path_to_dir == root:
+                return self.depth
+            if path_to_dir.startswith(f"{root.rstrip(os.path.sep)}{os.path.sep}"):
+                level = len(os.path.relpath(path_to_dir, root).split(os.path.sep))
+                return self.depth - level
+        return None
+
+    def update(self, timeout: float = 0.0) -> int:
+        """Apply any changes, waiting up to timeout seconds for them
+
+        Give how many directories changed, or were gone
+        """
+        changed, gone = self.notifier.changes(timeout)
+        polled_changed, polled_gone = self.poller.changes()
+        changed |= polled_changed
+        gone |= polled_gone
+        if getattr(self.notifier, "overflowed", False):
+            self.notifier.overflowed = False
+            self.start()
+        if self.tree:
+            for path_ in sorted(changed):
+                depth = self.depth_below(path_)
+                if depth is not None:
+                    self._watch(self.tree.update(path_, depth, self.descend))
+            for path_ in gone:
+                self.tree.update(path_, 0)
+        self._forget_lost(gone)
+        return len(changed) + len(gone)
+
+    def _forget_lost(self, gone: Set[str]) -> None:
+        """Forget paths in history which are gone, or under directories which are
+
+        And check a few more paths in history, in turn
+        """
+        if not self._unchecked:
+            self._unchecked = list(self.history_paths())
+        checking = self._unchecked[-self.checks :]
+        del self._unchecked[-self.checks :]
+        prefixes = tuple(f"{_.rstrip(os.path.sep)}{os.path.sep}" for _ in gone)
+        lost = [
+            _
+            for _ in (self.history_paths() if gone else [])
+            if _ in gone or _.startswith(prefixes)
+        ]
+        lost.extend(_ for _ in checking if _ not in lost and not os.path.isdir(_))
+        if lost:
+            self.forget(lost)
+
+    def run(self, timeout: float = 1.0) -> None:
+        """Apply changes as they happen, until interrupted"""
+        self.start()
+        try:
+            while True:
+                self.update(timeout)
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        self.notifier.close()
+        self.poller.close()